@@ -0,0 +1,290 @@
+'''
+Benchmarks for the rayleighpy hot paths.
+
+Run the suite and save the results to JSON:
+
+    python benchmarks/bench.py run -o bench.json [--quick]
+
+Compare two result files and flag cases that got slower (or use more memory or allocate more arrays) by more than a threshold ratio:
+
+    python benchmarks/bench.py compare base.json new.json [--threshold 1.2]
+'''
+import argparse
+import ctypes
+import json
+import multiprocessing
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+import numpy as np
+from rayleighpy import polarizability
+from rayleighpy import transform
+from rayleighpy import vectors
+from rayleighpy import fields
+from rayleighpy import kernel
+
+K = 2.*np.pi/32.1
+
+def _angles(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.random(n)*2.*np.pi, rng.random(n)*np.pi
+
+def _tensors(nori):
+    alpha, beta = _angles(nori)
+    alp_a, alp_b, alp_c = polarizability.ellipsoid(2.,0.9,0.1, 3.17+0.1j)
+    return transform.pc_rotate(alp_a, alp_b, alp_c, alpha, beta, 0.*alpha)
+
+# each case takes (L, N, M) and returns the function to time
+def case_ellipsoid(nori, ninc, nsca):
+    a, b = np.exp(np.random.default_rng(0).uniform(-2., 2., (2,nori)))
+    return lambda: polarizability.ellipsoid(a, b, 1., 3.17+0.1j)
+
+def case_pc_rotate(nori, ninc, nsca):
+    alpha, beta = _angles(nori)
+    return lambda: transform.pc_rotate(1.+0.1j, 2.+0.2j, 3.+0.3j, alpha, beta, alpha)
+
+def case_tensor_scat(nori, ninc, nsca):
+    alp_tens = _tensors(nori)
+    bas_inc = vectors.spherical_basis(*_angles(ninc, 1))
+    bas_sca = vectors.spherical_basis(*_angles(nsca, 2))
+    return lambda: transform.tensor_scat(alp_tens, bas_inc, bas_sca)
+
+def case_bh_hv_basis(nori, ninc, nsca):
+    rng = np.random.default_rng(0)
+    smat_bh = rng.standard_normal((2,2,nori,ninc*nsca))+1j*rng.standard_normal((2,2,nori,ninc*nsca))
+    phi = rng.random(ninc*nsca)*2.*np.pi
+    return lambda: transform.bh_hv_basis(smat_bh, phi)
+
+def case_ampl_scat_mat(nori, ninc, nsca):
+    alp_tens = _tensors(nori)
+    phi_inc, theta_inc = _angles(ninc, 1)
+    phi_sca, theta_sca = _angles(nsca, 2)
+    return lambda: fields.ampl_scat_mat(phi_inc, theta_inc, phi_sca, theta_sca, alp_tens, K)
+
+def case_ampl_fscat_mat(nori, ninc, nsca):
+    alp_tens = _tensors(nori)
+    phi, theta = _angles(ninc, 1)
+    return lambda: fields.ampl_fscat_mat(phi, theta, alp_tens, K)
+
+def case_ampl_scat_mat_bh(nori, ninc, nsca):
+    alp_tens = _tensors(nori)
+    phi = np.linspace(0., 2.*np.pi, ninc)
+    theta = np.linspace(0., np.pi, nsca)
+    return lambda: fields.ampl_scat_mat_bh(phi, theta, alp_tens, K)
+
+def case_workspace(nori, ninc, nsca):
+    alp_tens = _tensors(nori)
+    work = fields.AmplitudeWorkspace(*_angles(ninc, 1), *_angles(nsca, 2), nori, K)
+    out = np.empty(work.shape, dtype=complex)
+    return lambda: work(alp_tens, out=out)
+
+def case_fused_scat(backend):
+    def case(nori, ninc, nsca):
+        rng = np.random.default_rng(0)
+        a, b = np.exp(rng.uniform(-1., 1., (2,nori)))
+        alpha, beta = _angles(nori)
+        phi_inc, theta_inc = _angles(ninc, 1)
+        phi_sca, theta_sca = _angles(nsca, 2)
+        return lambda: kernel.fused_scat(a, b, 1., 3.17+0.1j, alpha, beta, alpha, phi_inc, theta_inc, phi_sca, theta_sca,
+                                         K, backend=backend)
+    return case
+
+CASES = {'ellipsoid':(case_ellipsoid, [(1000,1,1), (100000,1,1), (1000000,1,1)]),
+         'pc_rotate':(case_pc_rotate, [(1000,1,1), (100000,1,1), (1000000,1,1)]),
+         'tensor_scat':(case_tensor_scat, [(1,100,100), (100,100,100), (1000,1,1000), (2000,73,37)]),
+         'bh_hv_basis':(case_bh_hv_basis, [(10,73,37), (500,73,37)]),
+         'ampl_scat_mat':(case_ampl_scat_mat, [(1,73,37), (100,100,100), (1000,1,2701)]),
+         'ampl_fscat_mat':(case_ampl_fscat_mat, [(100,2701,1), (10000,100,1)]),
+         'ampl_scat_mat_bh':(case_ampl_scat_mat_bh, [(1,73,37), (100,73,37), (1000,73,37)]),
+         'workspace':(case_workspace, [(1,73,37), (100,100,100), (1000,1,2701)]),
+         'fused_numpy':(case_fused_scat('numpy'), [(1,73,37), (100,100,100), (1000,1,2701)])}
+
+# the compiled kernel is only benchmarked when numba is installed
+if kernel.numba is not None:
+    CASES['fused_numba'] = (case_fused_scat('numba'), CASES['fused_numpy'][1])
+
+# memory below this many bytes is treated as equal when comparing, so small fluctuations are not flagged
+MIN_BYTES = 2**16
+
+QUICK = {name:(case, sizes[:1]) for name, (case, sizes) in CASES.items()}
+
+_MALLOC = ctypes.CFUNCTYPE(ctypes.c_void_p, ctypes.c_void_p, ctypes.c_size_t)
+_CALLOC = ctypes.CFUNCTYPE(ctypes.c_void_p, ctypes.c_void_p, ctypes.c_size_t, ctypes.c_size_t)
+_REALLOC = ctypes.CFUNCTYPE(ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_size_t)
+_FREE = ctypes.CFUNCTYPE(None, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_size_t)
+
+class _Handler(ctypes.Structure):
+    # PyDataMem_Handler from numpy/ndarraytypes.h
+    _fields_ = [('name', ctypes.c_char*127), ('version', ctypes.c_uint8), ('ctx', ctypes.c_void_p),
+                ('malloc', _MALLOC), ('calloc', _CALLOC), ('realloc', _REALLOC), ('free', _FREE)]
+
+class AllocationCounter:
+    '''
+    Count the numpy array buffers allocated in the current thread while active, including the temporaries freed before the end.
+    
+    The counter is a numpy data memory handler (see "Memory management in NumPy" in the numpy docs) that forwards to the default handler, so freeing never calls back into Python and arrays that outlive the counter are safe. It is installed through the numpy C API table with ctypes and raises `AttributeError` or `OSError` where that is unavailable.
+    '''
+    def __init__(self):
+        api = ctypes.pythonapi
+        api.PyCapsule_GetPointer.restype = ctypes.c_void_p
+        api.PyCapsule_GetPointer.argtypes = [ctypes.py_object, ctypes.c_char_p]
+        api.PyCapsule_New.restype = ctypes.py_object
+        api.PyCapsule_New.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_void_p]
+        table = ctypes.cast(api.PyCapsule_GetPointer(np._core._multiarray_umath._ARRAY_API, None), ctypes.POINTER(ctypes.c_void_p))
+        # PyDataMem_SetHandler and PyDataMem_GetHandler
+        self._set_handler = ctypes.PYFUNCTYPE(ctypes.py_object, ctypes.py_object)(table[304])
+        default = ctypes.PYFUNCTYPE(ctypes.py_object)(table[305])()
+        base = _Handler.from_address(api.PyCapsule_GetPointer(default, b'mem_handler'))
+        
+        # the default functions are called without releasing the GIL held by the callbacks
+        forward = lambda name, proto: ctypes.PYFUNCTYPE(proto._restype_, *proto._argtypes_)(ctypes.cast(getattr(base, name), ctypes.c_void_p).value)
+        base_malloc, base_calloc, base_realloc = forward('malloc', _MALLOC), forward('calloc', _CALLOC), forward('realloc', _REALLOC)
+        self.count = 0
+        def malloc(ctx, size):
+            self.count += 1
+            return base_malloc(ctx, size)
+        def calloc(ctx, nelem, elsize):
+            self.count += 1
+            return base_calloc(ctx, nelem, elsize)
+        def realloc(ctx, ptr, new_size):
+            self.count += 1
+            return base_realloc(ctx, ptr, new_size)
+        self._handler = _Handler(b'allocation_counter', base.version, base.ctx, _MALLOC(malloc), _CALLOC(calloc), _REALLOC(realloc), base.free)
+        self._capsule = api.PyCapsule_New(ctypes.addressof(self._handler), b'mem_handler', None)
+    
+    def __enter__(self):
+        self.count = 0
+        self._prev = self._set_handler(self._capsule)
+        return self
+    
+    def __exit__(self, *exc):
+        self._set_handler(self._prev)
+
+def measure(case, size, repeat):
+    '''
+    Get the best wall time, peak resident set size, peak traced allocation, transient allocation and array allocation count for one case and size.
+    
+    The transient allocation is the peak minus the memory still held after the call (mostly the result), so it tracks the temporaries. The allocation count is the number of numpy array buffers allocated during the call, temporaries included (see `AllocationCounter`), or None where the counter cannot be installed.
+    '''
+    func = case(*size)
+    func()
+    wall = []
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        wall.append(time.perf_counter()-t0)
+    
+    # allocations are traced and counted separately so the tracing does not slow the timing
+    tracemalloc.start()
+    result = func()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    try:
+        counter = AllocationCounter()
+    except (AttributeError, OSError):
+        nalloc = None
+    else:
+        with counter:
+            result = func()
+        nalloc = counter.count
+        del result
+    
+    return {'time':min(wall),
+            'peak_rss':resource.getrusage(resource.RUSAGE_SELF).ru_maxrss*1024,
+            'peak_alloc':peak,
+            'temp_alloc':peak-current,
+            'allocs':nalloc}
+
+def _measure_child(conn, name, size, repeat):
+    case = CASES[name][0]
+    conn.send(measure(case, size, repeat))
+    conn.close()
+
+def run(cases, repeat):
+    # each case runs in a fresh process so the peak RSS belongs to that case alone
+    ctx = multiprocessing.get_context('fork')
+    results = []
+    for name, (case, sizes) in cases.items():
+        for size in sizes:
+            parent, child = ctx.Pipe()
+            proc = ctx.Process(target=_measure_child, args=(child, name, size, repeat))
+            proc.start()
+            res = parent.recv()
+            proc.join()
+            res.update({'case':name, 'L':size[0], 'N':size[1], 'M':size[2]})
+            results.append(res)
+            print(f"{name:18s} L={size[0]:<8d} N={size[1]:<5d} M={size[2]:<5d} "
+                  f"{res['time']*1.e3:10.3f} ms {res['peak_alloc']/2.**20:10.1f} MiB", file=sys.stderr)
+    return results
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(base, new, threshold):
+    '''
+    Print the ratios of the new to the base results and return the cases that regressed by more than `threshold`.
+    '''
+    key = lambda res: (res['case'], res['L'], res['N'], res['M'])
+    base_res = {key(res):res for res in base['results']}
+    regressions = []
+    for res in new['results']:
+        ref = base_res.get(key(res))
+        if ref is None:
+            continue
+        flags = []
+        for field in ('time', 'peak_rss', 'peak_alloc', 'temp_alloc', 'allocs'):
+            if ref.get(field) is None or res.get(field) is None:
+                continue
+            if field=='time':
+                ratio = res[field]/ref[field] if ref[field]>0 else 1.
+            elif field=='allocs':
+                ratio = max(res[field], 1)/max(ref[field], 1)
+            else:
+                ratio = max(res[field], MIN_BYTES)/max(ref[field], MIN_BYTES)
+            flags.append(f'{field} x{ratio:.2f}')
+            if ratio>threshold:
+                regressions.append((key(res), field, ratio))
+        print(f'{key(res)}: '+', '.join(flags))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='rayleighpy benchmarks')
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_run = sub.add_parser('run', help='run the benchmarks')
+    p_run.add_argument('-o', '--output', default='bench.json')
+    p_run.add_argument('--quick', action='store_true', help='only the smallest size of each case')
+    p_run.add_argument('--repeat', type=int, default=5)
+    p_run.add_argument('--case', action='append', help='run only the named cases')
+    p_cmp = sub.add_parser('compare', help='compare two result files')
+    p_cmp.add_argument('base')
+    p_cmp.add_argument('new')
+    p_cmp.add_argument('--threshold', type=float, default=1.2)
+    args = parser.parse_args()
+    
+    if args.command=='run':
+        cases = QUICK if args.quick else CASES
+        if args.case:
+            cases = {name:cases[name] for name in args.case}
+        meta = {'commit':_commit(), 'python':platform.python_version(), 'numpy':np.__version__,
+                'machine':platform.machine(), 'date':time.strftime('%Y-%m-%dT%H:%M:%S')}
+        with open(args.output, 'w') as f:
+            json.dump({'meta':meta, 'results':run(cases, args.repeat)}, f, indent=1)
+    else:
+        with open(args.base) as f:
+            base = json.load(f)
+        with open(args.new) as f:
+            new = json.load(f)
+        regressions = compare(base, new, args.threshold)
+        for key, field, ratio in regressions:
+            print(f'REGRESSION {key} {field} x{ratio:.2f}')
+        sys.exit(1 if regressions else 0)
+
+if __name__=='__main__':
+    main()
@@ -0,0 +1,125 @@
+import warnings
+import numpy as np
+from scipy import fft
+from scipy.sparse.linalg import LinearOperator, gmres
+from .polarizability import ellipsoid
+from .transform import pc_rotate
+from .vectors import spherical_basis
+
+def cdm_scat_mat(pos, a, b, c, eps, alpha, beta, gamma, phi_inc, theta_inc, phi_sca, theta_sca, k, spacing=None,
+                 tol=1.e-8, restart=50, maxiter=200):
+    '''
+    Get the amplitude scattering matrices of an aggregate of ellipsoidal monomers with the coupled-dipole method.
+    
+    Each monomer is a dipole with the polarizability tensor from `polarizability.ellipsoid` and `transform.pc_rotate`. The local fields at the monomers are solved with GMRES. When `spacing` is given, the monomers lie on a cubic lattice and the dipole interactions are applied with FFT convolutions, so the memory and time of each iteration scale with the lattice size instead of the squared number of monomers. Otherwise the (3P,3P) interaction matrix is formed densely, which suits small or off-lattice aggregates since it takes O(P^2) memory (about 14 GB for 1e4 monomers).
+    
+    Parameters
+    ----------
+    pos : ndarray (P,3)
+        The monomer positions in the length units of `k`.
+    a : ndarray (P,)
+        The a axis lengths.
+    b : ndarray (P,)
+        The b axis lengths.
+    c : ndarray (P,)
+        The c axis lengths.
+    eps : ndarray (P,)
+        The complex relative permittivities.
+    alpha : ndarray (P,)
+        The first Euler angles (zyz convention, radians).
+    beta : ndarray (P,)
+        The second Euler angles.
+    gamma : ndarray (P,)
+        The third Euler angles.
+    phi_inc : ndarray (N,)
+        The incident phi angles in radians.
+    theta_inc : ndarray (N,)
+        The incident theta angles in radians.
+    phi_sca : ndarray (M,)
+        The scattered phi angles in radians.
+    theta_sca : ndarray (M,)
+        The scattered theta angles in radians.
+    k : float
+        The wave number for the incident wave.
+    spacing : float, optional
+        The lattice spacing of the monomer positions.
+    tol : float
+        The relative residual tolerance of GMRES.
+    restart : int
+        The number of GMRES iterations between restarts.
+    maxiter : int
+        The maximum number of GMRES restart cycles.
+    
+    Returns
+    -------
+    smat : ndarray
+        The (2,2,1,N,M) amplitude scattering matrices of the aggregate in the `fields.ampl_scat_mat` convention.
+    '''
+    pos = np.atleast_2d(np.asarray(pos, dtype=float))
+    npos = pos.shape[0]
+    alp_tens = pc_rotate(*ellipsoid(a, b, c, eps), alpha, beta, gamma)
+    alp_tens = np.broadcast_to(alp_tens, (3,3,npos))
+    if spacing is None:
+        interact = _dense_op(pos, k)
+    else:
+        interact = _fft_op(pos, k, spacing)
+    
+    # solve E - G alpha E = E_inc for the local fields of each incident direction and polarization
+    matvec = lambda x: x-interact(np.einsum('ijp,jp->ip', alp_tens, x.reshape(3,npos))).ravel()
+    op = LinearOperator((3*npos,3*npos), matvec=matvec, dtype=complex)
+    bas_inc = spherical_basis(phi_inc, theta_inc)
+    phase_inc = np.exp(1j*k*pos@bas_inc[:,2])
+    
+    bas_sca = spherical_basis(phi_sca, theta_sca)
+    phase_sca = np.exp(-1j*k*pos@bas_sca[:,2])
+    smat = np.empty((2,2,1,bas_inc.shape[2],bas_sca.shape[2]), dtype=complex)
+    for n in range(bas_inc.shape[2]):
+        for j in range(2):
+            rhs = (bas_inc[:,j,n,np.newaxis]*phase_inc[:,n]).ravel()
+            field, info = gmres(op, rhs, rtol=tol, restart=restart, maxiter=maxiter)
+            if info>0:
+                warnings.warn(f'coupled-dipole solution did not converge for incident direction {n}')
+            
+            # far field of the dipoles projected on the scattered v and h vectors
+            dip = np.einsum('ijp,jp->ip', alp_tens, field.reshape(3,npos))
+            smat[:,j,0,n] = 1j*k**3./(4.*np.pi)*np.einsum('iqm,ip,pm->qm', bas_sca[:,:2], dip, phase_sca)
+    return smat
+
+def _green(rvec, k):
+    # (3,3,...) dipole field tensors for separations (3,...), zero at zero separation
+    dist = np.sqrt(np.sum(rvec**2., axis=0))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rhat = rvec/dist
+        scale = np.exp(1j*k*dist)/(4.*np.pi*dist)
+        near = (1.-1j*k*dist)/dist**2.
+    rr = rhat[:,np.newaxis]*rhat[np.newaxis]
+    eye = np.eye(3).reshape((3,3)+(1,)*dist.ndim)
+    gten = scale*(k**2.*(eye-rr)+near*(3.*rr-eye))
+    gten[:,:,dist==0.] = 0.
+    return gten
+
+def _dense_op(pos, k):
+    npos = pos.shape[0]
+    gten = _green(pos.T[:,:,np.newaxis]-pos.T[:,np.newaxis], k)
+    gmat = np.transpose(gten, (0,2,1,3)).reshape(3*npos,3*npos)
+    return lambda dip: (gmat@dip.ravel()).reshape(3,npos)
+
+def _fft_op(pos, k, spacing):
+    idx = np.rint(pos/spacing).astype(int)
+    if not np.allclose(idx*spacing, pos, rtol=0., atol=1.e-6*spacing):
+        raise ValueError('monomer positions are not on a lattice with the given spacing')
+    idx = idx-np.min(idx, axis=0)
+    nlat = np.max(idx, axis=0)+1
+    shape = tuple(2*nlat)
+    
+    # dipole field tensors for the wrapped lattice offsets, transformed once
+    offsets = np.meshgrid(*(np.fft.fftfreq(2*n, 1./(2*n)) for n in nlat), indexing='ij')
+    gten_f = fft.fftn(_green(np.array(offsets)*spacing, k), axes=(2,3,4))
+    sites = tuple(idx.T)
+    
+    def interact(dip):
+        grid = np.zeros((3,)+shape, dtype=complex)
+        grid[(slice(None),)+sites] = dip
+        grid = fft.ifftn(np.einsum('ij...,j...->i...', gten_f, fft.fftn(grid, axes=(1,2,3))), axes=(1,2,3))
+        return grid[(slice(None),)+sites]
+    return interact
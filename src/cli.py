@@ -0,0 +1,196 @@
+'''
+Command-line batch calculation of amplitude scattering matrices for particle tables.
+
+The input is a CSV file with a header row or a .npy file (a structured array, or a 2D float array with the columns in the order below) with one particle per row:
+
+    a, b, c, eps_re, eps_im, wavelength[, alpha, beta, gamma]
+
+The Euler angles are in radians and default to zero. The (2,2,P,N,M) amplitude matrices (see `fields.ampl_scat_mat`) are written to a .npy file chunk by chunk, and an interrupted run continues from the last completed chunk with `--resume`:
+
+    rayleighpy particles.csv smat.npy --phi-sca 0,90 --theta-sca 90,90 --workers 4
+'''
+import argparse
+import itertools
+import os
+import sys
+import time
+import numpy as np
+from .polarizability import ellipsoid
+from .transform import pc_rotate
+from .fields import ampl_scat_mat
+
+COLUMNS = ('a', 'b', 'c', 'eps_re', 'eps_im', 'wavelength', 'alpha', 'beta', 'gamma')
+
+def _count_rows(fname):
+    if fname.endswith('.npy'):
+        return len(np.load(fname, mmap_mode='r'))
+    with open(fname) as f:
+        return sum(1 for line in f if line.strip())-1
+
+def _columns(data, names):
+    # dict of the particle columns with zero Euler angles by default
+    cols = {name:data[:,names.index(name)] for name in names if name in COLUMNS}
+    missing = [name for name in COLUMNS[:6] if name not in cols]
+    if missing:
+        raise ValueError(f'missing input columns {missing}')
+    for name in COLUMNS[6:]:
+        cols.setdefault(name, np.zeros(len(data)))
+    return cols
+
+def read_chunks(fname, chunk, start=0):
+    '''
+    Generate the particle columns of an input table in chunks.
+    
+    Parameters
+    ----------
+    fname : str
+        The CSV or .npy input file.
+    chunk : int
+        The number of particles in each chunk.
+    start : int
+        The first particle to read.
+    
+    Yields
+    ------
+    pstart : int
+        The index of the first particle of the chunk.
+    cols : dict
+        The (chunk,) arrays of each column.
+    '''
+    if fname.endswith('.npy'):
+        table = np.load(fname, mmap_mode='r')
+        for p0 in range(start, len(table), chunk):
+            rows = table[p0:p0+chunk]
+            if rows.dtype.names is None:
+                yield p0, _columns(np.asarray(rows, dtype=float), list(COLUMNS[:rows.shape[1]]))
+            else:
+                yield p0, _columns(np.array([rows[name] for name in rows.dtype.names], dtype=float).T,
+                                   list(rows.dtype.names))
+        return
+    
+    with open(fname) as f:
+        names = [name.strip() for name in f.readline().split(',')]
+        lines = (line for line in f if line.strip())
+        for line in itertools.islice(lines, start):
+            pass
+        p0 = start
+        while True:
+            block = list(itertools.islice(lines, chunk))
+            if not block:
+                return
+            yield p0, _columns(np.loadtxt(block, delimiter=',', ndmin=2), names)
+            p0 += len(block)
+
+def run(fname_in, fname_out, phi_inc, theta_inc, phi_sca, theta_sca, grid=False, chunk=1000, workers=1,
+        dtype=complex, resume=False, progress=sys.stderr):
+    '''
+    Compute the amplitude scattering matrices of the particles in an input table, writing them to a .npy file in chunks.
+    
+    The number of completed particles is kept in `fname_out+'.done'`, which is removed when the run finishes.
+    
+    Parameters
+    ----------
+    fname_in : str
+        The CSV or .npy input file.
+    fname_out : str
+        The .npy output file for the (2,2,P,N,M) amplitude matrices.
+    phi_inc : ndarray (N,)
+        The incident phi angles in radians.
+    theta_inc : ndarray (N,)
+        The incident theta angles in radians.
+    phi_sca : ndarray (M,)
+        The scattered phi angles in radians.
+    theta_sca : ndarray (M,)
+        The scattered theta angles in radians.
+    grid : bool
+        Whether `phi_sca` and `theta_sca` are grid axes (see `fields.ampl_scat_mat`).
+    chunk : int
+        The number of particles in each chunk.
+    workers : int
+        The number of threads for the rotations and amplitude matrices.
+    dtype : data-type
+        The complex floating point type of the output.
+    resume : bool
+        Whether to continue an interrupted run into an existing output file.
+    progress : file, optional
+        The stream for the progress report.
+    
+    Returns
+    -------
+    smat : numpy.memmap
+        The amplitude matrices.
+    '''
+    npart = _count_rows(fname_in)
+    nsca = np.size(phi_sca)*np.size(theta_sca) if grid else np.size(phi_sca)
+    shape = (2,2,npart,np.size(phi_inc),nsca)
+    fname_done = fname_out+'.done'
+    
+    start = 0
+    if resume and os.path.exists(fname_out):
+        smat = np.lib.format.open_memmap(fname_out, mode='r+')
+        if smat.shape!=shape or smat.dtype!=np.dtype(dtype):
+            raise ValueError(f'{fname_out} has shape {smat.shape} and type {smat.dtype}, expected {shape} and {np.dtype(dtype)}')
+        if not os.path.exists(fname_done):
+            return smat
+        with open(fname_done) as f:
+            start = int(f.read())
+    else:
+        smat = np.lib.format.open_memmap(fname_out, mode='w+', dtype=dtype, shape=shape)
+        with open(fname_done, 'w') as f:
+            f.write('0')
+    
+    t0 = time.perf_counter()
+    for p0, cols in read_chunks(fname_in, chunk, start=start):
+        npc = len(cols['a'])
+        alp = ellipsoid(cols['a'], cols['b'], cols['c'], cols['eps_re']+1j*cols['eps_im'])
+        alp_tens = pc_rotate(*alp, cols['alpha'], cols['beta'], cols['gamma'], dtype=dtype, workers=workers)
+        
+        # one amplitude calculation per distinct wavelength in the chunk
+        wavl, inverse = np.unique(cols['wavelength'], return_inverse=True)
+        for iw in range(len(wavl)):
+            rows = np.flatnonzero(inverse==iw)
+            smat[:,:,p0+rows] = ampl_scat_mat(phi_inc, theta_inc, phi_sca, theta_sca, alp_tens[:,:,rows],
+                                              2.*np.pi/wavl[iw], grid=grid, dtype=dtype, workers=workers)
+        
+        # record the completed particles only after the chunk reaches the file
+        smat.flush()
+        with open(fname_done, 'w') as f:
+            f.write(str(p0+npc))
+        if progress is not None:
+            rate = (p0+npc-start)/max(time.perf_counter()-t0, 1.e-9)
+            print(f'{p0+npc}/{npart} particles, {rate:.0f} particles/s', file=progress, flush=True)
+    
+    if os.path.exists(fname_done):
+        os.remove(fname_done)
+    return smat
+
+def _angles(text):
+    # comma separated degrees to radians
+    return np.array([float(val) for val in text.split(',')])*np.pi/180.
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='rayleighpy', description=__doc__.strip().split('\n')[0])
+    parser.add_argument('input', help='CSV or .npy particle table')
+    parser.add_argument('output', help='.npy file for the (2,2,P,N,M) amplitude matrices')
+    parser.add_argument('--phi-inc', type=_angles, default=_angles('0'), help='incident phi angles (degrees, comma separated)')
+    parser.add_argument('--theta-inc', type=_angles, default=_angles('90'), help='incident theta angles (degrees)')
+    parser.add_argument('--phi-sca', type=_angles, help='scattered phi angles (degrees), default backscattering')
+    parser.add_argument('--theta-sca', type=_angles, help='scattered theta angles (degrees)')
+    parser.add_argument('--grid', action='store_true', help='treat the scattered angles as grid axes')
+    parser.add_argument('--chunk', type=int, default=1000, help='particles per chunk')
+    parser.add_argument('--workers', type=int, default=1, help='worker threads')
+    parser.add_argument('--single', action='store_true', help='single precision output')
+    parser.add_argument('--resume', action='store_true', help='continue an interrupted run')
+    parser.add_argument('--quiet', action='store_true', help='no progress report')
+    args = parser.parse_args(argv)
+    
+    if args.phi_sca is None:
+        args.phi_sca, args.theta_sca = args.phi_inc+np.pi, np.pi-args.theta_inc
+    elif args.theta_sca is None:
+        parser.error('--theta-sca is required with --phi-sca')
+    run(args.input, args.output, args.phi_inc, args.theta_inc, args.phi_sca, args.theta_sca, grid=args.grid,
+        chunk=args.chunk, workers=args.workers, dtype=np.complex64 if args.single else complex, resume=args.resume,
+        progress=None if args.quiet else sys.stderr)
+
+if __name__=='__main__':
+    main()
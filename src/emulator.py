@@ -0,0 +1,129 @@
+import numpy as np
+from .polarizability import ellipsoid
+from .transform import pc_rotate
+from .radar import _back_fwd
+
+def build_emulator(ratio_range=(0.1,10.), eps_re_range=(1.,4.), eps_im_range=(0.,1.), beta_range=(0.,np.pi/2.),
+                   shape=(17,17,9,9,19), phi=0., theta=np.pi/2., alpha=0., gamma=0.):
+    '''
+    Tabulate the backscattering and forward scattering amplitude matrices over particle parameters for interpolation.
+    
+    The amplitudes are tabulated per unit `(k c)^3` on a regular grid in log(a/c), log(b/c), Re(eps), Im(eps) and the canting angle beta, for a fixed beam direction and fixed first and third Euler angles.
+    
+    Parameters
+    ----------
+    ratio_range : tuple
+        The smallest and largest axis ratios a/c and b/c.
+    eps_re_range : tuple
+        The range of the real part of the permittivity.
+    eps_im_range : tuple
+        The range of the imaginary part of the permittivity.
+    beta_range : tuple
+        The range of the second Euler angle in radians.
+    shape : tuple
+        The odd number of grid points along each of the five parameters.
+    phi : float
+        The phi angle of the beam propagation direction in radians.
+    theta : float
+        The theta angle of the beam propagation direction in radians.
+    alpha : float
+        The first Euler angle of the particles (zyz convention, radians).
+    gamma : float
+        The third Euler angle of the particles.
+    
+    Returns
+    -------
+    emu : dict
+        The emulator with the grid `'axes'` and the tabulated `'values'` of shape `shape+(2,2,2)`, where the last axis selects the backscattering or forward scattering amplitudes.
+    '''
+    if any(n%2==0 or n<3 for n in shape):
+        raise ValueError('the emulator grid needs an odd number (at least 3) of points along each parameter')
+    axes = [np.linspace(np.log(ratio_range[0]), np.log(ratio_range[1]), shape[0]),
+            np.linspace(np.log(ratio_range[0]), np.log(ratio_range[1]), shape[1]),
+            np.linspace(eps_re_range[0], eps_re_range[1], shape[2]),
+            np.linspace(eps_im_range[0], eps_im_range[1], shape[3]),
+            np.linspace(beta_range[0], beta_range[1], shape[4])]
+    lnr_a, lnr_b, eps_re, eps_im, beta = (ax.flatten() for ax in np.meshgrid(*axes, indexing='ij'))
+    
+    # scaled tensors for c = 1 and amplitudes for k = 1
+    alp_a, alp_b, alp_c = ellipsoid(np.exp(lnr_a), np.exp(lnr_b), 1., eps_re+1j*eps_im)
+    alp_tens = pc_rotate(alp_a, alp_b, alp_c, alpha, beta, gamma)
+    smat_back, smat_fwd = _back_fwd(alp_tens, phi, theta)
+    values = np.stack((smat_back, smat_fwd), axis=-1).reshape(2,2,*shape,2)
+    
+    return {'axes':axes, 'values':np.moveaxis(values, (0,1), (-3,-2)),
+            'phi':phi, 'theta':theta, 'alpha':alpha, 'gamma':gamma}
+
+def query_emulator(emu, a, b, c, eps, beta, k):
+    '''
+    Interpolate the backscattering and forward scattering amplitude matrices for particles from an emulator (see `build_emulator`).
+    
+    The error estimate compares the interpolation on the full grid with the interpolation on every other grid point. Since the multilinear interpolation error scales with the squared grid spacing, a third of the difference estimates the error on the full grid. Particles outside the tabulated ranges are computed exactly instead, with zero error estimates.
+    
+    Parameters
+    ----------
+    emu : dict
+        The emulator.
+    a : ndarray (P,)
+        The a axis lengths.
+    b : ndarray (P,)
+        The b axis lengths.
+    c : ndarray (P,)
+        The c axis lengths.
+    eps : ndarray (P,)
+        The complex relative permittivities.
+    beta : ndarray (P,)
+        The second Euler angles in radians.
+    k : float
+        The wave number for the incident wave.
+    
+    Returns
+    -------
+    smat_back : ndarray
+        The (2,2,P) backscattering amplitude matrices.
+    smat_fwd : ndarray
+        The (2,2,P) forward scattering amplitude matrices.
+    err_back : ndarray
+        The (2,2,P) estimated absolute interpolation errors of `smat_back`.
+    err_fwd : ndarray
+        The (2,2,P) estimated absolute interpolation errors of `smat_fwd`.
+    '''
+    a, b, c, eps, beta = np.broadcast_arrays(*np.atleast_1d(a, b, c, eps, beta))
+    points = [np.log(a/c), np.log(b/c), np.real(eps), np.imag(eps), beta]
+    
+    values = _interp(emu['axes'], emu['values'], points)
+    coarse = _interp([ax[::2] for ax in emu['axes']], emu['values'][::2,::2,::2,::2,::2], points)
+    scale = (k*c)**3.
+    smat = np.moveaxis(values, 0, -2)*scale[:,np.newaxis]
+    err = np.moveaxis(np.abs(values-coarse)/3., 0, -2)*scale[:,np.newaxis]
+    
+    # exact amplitudes for the particles outside the grid, which the interpolation would clamp to the edges
+    outside = np.zeros(len(a), dtype=bool)
+    for ax, pt in zip(emu['axes'], points):
+        tol = 1.e-9*(ax[-1]-ax[0])
+        outside |= (pt<ax[0]-tol)|(pt>ax[-1]+tol)
+    if np.any(outside):
+        alp = ellipsoid(a[outside], b[outside], c[outside], eps[outside])
+        alp_tens = pc_rotate(*alp, emu['alpha'], beta[outside], emu['gamma'])
+        smat[:,:,outside] = np.stack(_back_fwd(alp_tens, emu['phi'], emu['theta'], k), axis=-1)
+        err[:,:,outside] = 0.
+    return smat[...,0], smat[...,1], err[...,0], err[...,1]
+
+def _interp(axes, values, points):
+    # multilinear interpolation on a regular grid, clamped to the grid edges
+    ndim = len(axes)
+    index = []
+    weight = []
+    for ax, pt in zip(axes, points):
+        x = np.clip((pt-ax[0])/(ax[1]-ax[0]), 0., len(ax)-1.)
+        i0 = np.minimum(np.floor(x).astype(int), len(ax)-2)
+        index.append(i0)
+        weight.append(x-i0)
+    
+    result = 0.
+    for corner in range(2**ndim):
+        bits = [(corner>>d)&1 for d in range(ndim)]
+        w = np.prod([wd if bit else 1.-wd for wd, bit in zip(weight, bits)], axis=0)
+        idx = tuple(i0+bit for i0, bit in zip(index, bits))
+        result = result+w[:,np.newaxis,np.newaxis,np.newaxis]*values[idx]
+    return result
@@ -1,8 +1,13 @@
 import numpy as np
-from .vectors import spherical_basis
-from .transform import tensor_scat
+from .vectors import spherical_basis, grid_basis
+from .transform import tensor_scat, unique_tensors, pc_rotate_jac, contraction_plan
+from .polarizability import ellipsoid_jac
+from .parallel import map_orient
+from .instrument import instrumented
 
-def ampl_scat_mat(phi_inc, theta_inc, phi_sca, theta_sca, alp_tens, k):
+@instrumented
+def ampl_scat_mat(phi_inc, theta_inc, phi_sca, theta_sca, alp_tens, k, out=None, max_bytes=None, grid=False, dtype=complex,
+                  workers=1, chunk=None, executor='thread', dedup=False):
     '''
     Get the amplitude scattering matrices for a polarizability tensor for a single incident angle and a set of scattering angles.
     
@@ -20,19 +25,187 @@ def ampl_scat_mat(phi_inc, theta_inc, phi_sca, theta_sca, alp_tens, k):
        A (3,3,L) complex array representing the polarizability tensor.
     k : float
        The wave number for the incident wave.
+    out : ndarray, optional
+       A preallocated (2,2,L,N,M) complex array (e.g., a `numpy.memmap`) to write the result into block by block.
+    max_bytes : int, optional
+       The memory budget in bytes for each block when `out` is given or when the calculation should be chunked.
+    grid : bool
+       Whether `phi_sca` and `theta_sca` are the 1D axes of a grid of scattered directions, in which case `M` is the number of grid points and `phi_sca` varies slowest.
+    dtype : data-type
+       The complex floating point type of the calculation (e.g., `np.complex64` for single precision).
+    workers : int
+       The number of threads or processes to split the orientations across.
+    chunk : int, optional
+       The number of orientations for each parallel task.
+    executor : str
+       `'thread'` or `'process'` (see `parallel.map_orient`).
+    dedup : bool
+       Whether to compute only the distinct tensors (see `transform.unique_tensors`) and expand the result.
     Returns
     -------
     smat : ndarray
       A (3,3,L,N,M) array of scattering amplitude matrices for each of the `N` scattering angle pairs.
     '''
+    if dedup:
+        tens_u, inverse = unique_tensors(alp_tens)
+        smat = ampl_scat_mat(phi_inc, theta_inc, phi_sca, theta_sca, tens_u, k, max_bytes=max_bytes, grid=grid,
+                             dtype=dtype, workers=workers, chunk=chunk, executor=executor)
+        return np.take(smat, inverse, axis=2, out=out)
+    
+    if workers>1:
+        nsca = np.size(phi_sca)*np.size(theta_sca) if grid else np.size(phi_sca)
+        alp_tens = _tensor_3d(alp_tens)
+        task_args = lambda lslice: ((phi_inc, theta_inc, phi_sca, theta_sca, alp_tens[:,:,lslice], k),
+                                    {'max_bytes':max_bytes, 'grid':grid, 'dtype':dtype})
+        return map_orient(ampl_scat_mat, task_args, alp_tens.shape[2], (2,2,alp_tens.shape[2],np.size(phi_inc),nsca),
+                          dtype, workers=workers, chunk=chunk, executor=executor, out=out)
+    
+    if out is not None or max_bytes is not None:
+        blocks = iter_ampl_scat_mat(phi_inc, theta_inc, phi_sca, theta_sca, alp_tens, k,
+                                    max_bytes=max_bytes or MAX_BLOCK_BYTES, grid=grid, dtype=dtype)
+        nsca = np.size(phi_sca)*np.size(theta_sca) if grid else np.size(phi_sca)
+        return _fill_blocks(blocks, out, (2,2,_norient(alp_tens),np.size(phi_inc),nsca), dtype)
+    
     # get basis vectors
-    bas_inc = spherical_basis(phi_inc, theta_inc)
-    bas_sca = spherical_basis(phi_sca, theta_sca)
-    smat = 1j*k**3./(4.*np.pi)*tensor_scat(alp_tens, bas_inc, bas_sca)
+    rdtype = np.finfo(dtype).dtype
+    bas_inc = spherical_basis(phi_inc, theta_inc, dtype=rdtype)
+    bas_sca = _sca_basis(phi_sca, theta_sca, grid, rdtype)
+    smat = _pref(k, dtype)*tensor_scat(np.asarray(alp_tens, dtype=dtype), bas_inc, bas_sca)
     
     return smat
 
-def ampl_fscat_mat(phi, theta, alp_tens, k):
+class AmplitudeWorkspace:
+    '''
+    A reusable plan for `ampl_scat_mat` with fixed directions and number of tensors.
+    
+    The basis vectors (with the amplitude prefactor folded into the incident vectors), the contraction order and the intermediate buffers are set up once, so repeated calls write into `out` without new array allocations and without modifying the input tensors. The `'sca'` contraction order of `transform.contraction_plan` is replaced by the `'inc'` order.
+    
+    Parameters
+    ----------
+    phi_inc : ndarray (N,)
+        The incident phi angles in radians.
+    theta_inc : ndarray (N,)
+        The incident theta angles in radians.
+    phi_sca : ndarray (M,)
+        The scattered phi angles in radians.
+    theta_sca : ndarray (M,)
+        The scattered theta angles in radians.
+    nori : int
+        The number of tensors `L` of each call.
+    k : float
+        The wave number for the incident wave.
+    grid : bool
+        Whether `phi_sca` and `theta_sca` are grid axes (see `ampl_scat_mat`).
+    dtype : data-type
+        The complex floating point type of the calculation.
+    '''
+    def __init__(self, phi_inc, theta_inc, phi_sca, theta_sca, nori, k, grid=False, dtype=complex):
+        rdtype = np.finfo(dtype).dtype
+        vh_inc = spherical_basis(phi_inc, theta_inc, dtype=rdtype)[:,:2]*_pref(k, dtype)
+        vh_sca = _sca_basis(phi_sca, theta_sca, grid, dtype=rdtype)[:,:2]
+        ninc, nsca = vh_inc.shape[2], vh_sca.shape[2]
+        self.shape = (2,2,nori,ninc,nsca)
+        self.dtype = np.dtype(dtype)
+        self.order = 'outer' if contraction_plan('general', nori, ninc, nsca)=='outer' else 'inc'
+        
+        if self.order=='outer':
+            # (4,9,N*M) outer products of the basis vectors and an (L,9) tensor buffer
+            bouter = vh_sca.transpose(1,0,2)[:,None,:,None,None,:]*vh_inc.transpose(1,0,2)[None,:,None,:,:,None]
+            self._bouter = np.ascontiguousarray(bouter.reshape(4,9,ninc*nsca))
+            self._tens = np.empty((nori,9), dtype=dtype)
+        else:
+            # (3,2N) incident and (2,3,M) scattered vectors with (L,3,3), (3L,2N) and (2,L,N,3) buffers
+            self._vh_inc = np.ascontiguousarray(vh_inc.reshape(3,2*ninc))
+            self._vh_sca = np.ascontiguousarray(vh_sca.transpose(1,0,2), dtype=dtype)
+            self._tens = np.empty((nori,3,3), dtype=dtype)
+            self._tens_inc = np.empty((3*nori,2*ninc), dtype=dtype)
+            self._tens_inc_t = np.empty((2,nori,ninc,3), dtype=dtype)
+    
+    def __call__(self, alp_tens, out=None):
+        '''
+        Get the (2,2,L,N,M) amplitude scattering matrices for a (3,3,L) tensor array, writing them into `out` when given.
+        '''
+        if out is None:
+            out = np.empty(self.shape, dtype=self.dtype)
+        elif out.shape!=self.shape or out.dtype!=self.dtype or not out.flags.c_contiguous:
+            raise ValueError(f'out must be a contiguous {self.dtype} array of shape {self.shape}')
+        nori, ninc, nsca = self.shape[2:]
+        alp_tens = _tensor_3d(alp_tens)
+        
+        if self.order=='outer':
+            np.copyto(self._tens.reshape(nori,3,3), alp_tens.transpose(2,0,1))
+            np.matmul(self._tens[np.newaxis], self._bouter, out=out.reshape(4,nori,ninc*nsca))
+        else:
+            np.copyto(self._tens, alp_tens.transpose(2,0,1))
+            np.matmul(self._tens.reshape(3*nori,3), self._vh_inc, out=self._tens_inc)
+            np.copyto(self._tens_inc_t, self._tens_inc.reshape(nori,3,2,ninc).transpose(2,0,3,1))
+            for i in range(2):
+                np.matmul(self._tens_inc_t.reshape(2,nori*ninc,3), self._vh_sca[i], out=out[i].reshape(2,nori*ninc,nsca))
+        return out
+
+def ampl_scat_mat_jac(phi_inc, theta_inc, phi_sca, theta_sca, a, b, c, eps, alpha, beta, gamma, k, grid=False,
+                      dtype=complex):
+    '''
+    Get the amplitude scattering matrices for ellipsoids and their derivatives with respect to the particle parameters.
+    
+    The amplitudes are linear in the polarizability tensor, so the tensors and their derivatives are stacked along the orientation axis and scattered together in one call to `ampl_scat_mat`.
+    
+    Parameters
+    ----------
+    phi_inc : ndarray (N,)
+        The incident phi angles in radians.
+    theta_inc : ndarray (N,)
+        The incident theta angles in radians.
+    phi_sca : ndarray (M,)
+        The scattered phi angles in radians.
+    theta_sca : ndarray (M,)
+        The scattered theta angles in radians.
+    a : ndarray (L,)
+        The a axis lengths.
+    b : ndarray (L,)
+        The b axis lengths.
+    c : ndarray (L,)
+        The c axis lengths.
+    eps : ndarray (L,)
+        The complex relative permittivities.
+    alpha : ndarray (L,)
+        The first Euler angles (zyz convention, radians).
+    beta : ndarray (L,)
+        The second Euler angles.
+    gamma : ndarray (L,)
+        The third Euler angles.
+    k : float
+        The wave number for the incident wave.
+    grid : bool
+        Whether `phi_sca` and `theta_sca` are grid axes (see `ampl_scat_mat`).
+    dtype : data-type
+        The complex floating point type of the calculation.
+    
+    Returns
+    -------
+    smat : ndarray
+        The (2,2,L,N,M) amplitude scattering matrices.
+    jac : ndarray
+        The (7,2,2,L,N,M) derivatives with respect to a, b, c, eps, alpha, beta and gamma. The derivatives with respect to the real and imaginary parts of eps are `jac[3]` and `1j*jac[3]`.
+    '''
+    a, b, c, eps, alpha, beta, gamma = np.broadcast_arrays(*np.atleast_1d(a, b, c, eps, alpha, beta, gamma))
+    alp, alp_jac = ellipsoid_jac(a, b, c, eps)
+    alp_tens, tens_jac = pc_rotate_jac(*alp, alpha, beta, gamma, dtype=dtype)
+    
+    # chain rule through the principal polarizabilities (8,3,3,L)
+    tens_all = np.empty((8,)+alp_tens.shape, dtype=dtype)
+    tens_all[0] = alp_tens
+    tens_all[1:5] = np.einsum('pjkl,pql->qjkl', tens_jac[:3], alp_jac)
+    tens_all[5:] = tens_jac[3:]
+    
+    nori = alp_tens.shape[2]
+    smat = ampl_scat_mat(phi_inc, theta_inc, phi_sca, theta_sca, np.moveaxis(tens_all, 0, 2).reshape(3,3,8*nori), k,
+                         grid=grid, dtype=dtype)
+    smat = np.moveaxis(smat.reshape((2,2,8,nori)+smat.shape[3:]), 2, 0)
+    return smat[0], smat[1:]
+
+@instrumented
+def ampl_fscat_mat(phi, theta, alp_tens, k, dtype=complex, workers=1, chunk=None, executor='thread', dedup=False):
     '''
     Get the amplitude scattering matrices in the forward scattering direction for a polarizability tensor for a set of angles.
     
@@ -46,18 +219,41 @@ def ampl_fscat_mat(phi, theta, alp_tens, k):
        A (3,3) complex array representing the polarizability tensor.
     k : float
        The wave number for the incident wave.
+    dtype : data-type
+       The complex floating point type of the calculation (e.g., `np.complex64` for single precision).
+    workers : int
+       The number of threads or processes to split the orientations across.
+    chunk : int, optional
+       The number of orientations for each parallel task.
+    executor : str
+       `'thread'` or `'process'` (see `parallel.map_orient`).
+    dedup : bool
+       Whether to compute only the distinct tensors (see `transform.unique_tensors`) and expand the result.
     Returns
     -------
     smat : ndarray
       A (3,3,L,N) array of scattering amplitude matrices for each of the `N` scattering angle pairs.
     '''
+    if dedup:
+        tens_u, inverse = unique_tensors(alp_tens)
+        smat = ampl_fscat_mat(phi, theta, tens_u, k, dtype=dtype, workers=workers, chunk=chunk, executor=executor)
+        return np.take(smat, inverse, axis=2)
+    
+    if workers>1:
+        alp_tens = _tensor_3d(alp_tens)
+        task_args = lambda lslice: ((phi, theta, alp_tens[:,:,lslice], k), {'dtype':dtype})
+        return map_orient(ampl_fscat_mat, task_args, alp_tens.shape[2], (2,2,alp_tens.shape[2],np.size(phi)),
+                          dtype, workers=workers, chunk=chunk, executor=executor)
+    
     # get basis vectors
-    bas_inc = spherical_basis(phi, theta)
-    smat = 1j*k**3./(4.*np.pi)*tensor_scat(alp_tens, bas_inc, bas_inc, fscat=True)
+    bas_inc = spherical_basis(phi, theta, dtype=np.finfo(dtype).dtype)
+    smat = _pref(k, dtype)*tensor_scat(np.asarray(alp_tens, dtype=dtype), bas_inc, bas_inc, fscat=True)
     
     return smat
     
-def ampl_scat_mat_bh(phi_1d_sca, theta_1d_sca, alp_tens, k):
+@instrumented
+def ampl_scat_mat_bh(phi_1d_sca, theta_1d_sca, alp_tens, k, out=None, max_bytes=None, dtype=complex,
+                     workers=1, chunk=None, executor='thread', dedup=False):
     '''
     Get the amplitude scattering matrices for a polarizability tensor for incident direction along the z axis and a set of scattering angles using the Bohren and Huffman (1983) convention.
     
@@ -71,23 +267,237 @@ def ampl_scat_mat_bh(phi_1d_sca, theta_1d_sca, alp_tens, k):
        A (3,3,L) complex array representing the polarizability tensor.
     k : float
        The wave number for the incident wave.
+    out : ndarray, optional
+       A preallocated (2,2,L,N,M) complex array (e.g., a `numpy.memmap`) to write the result into block by block.
+    max_bytes : int, optional
+       The memory budget in bytes for each block when `out` is given or when the calculation should be chunked.
+    dtype : data-type
+       The complex floating point type of the calculation (e.g., `np.complex64` for single precision).
+    workers : int
+       The number of threads or processes to split the orientations across.
+    chunk : int, optional
+       The number of orientations for each parallel task.
+    executor : str
+       `'thread'` or `'process'` (see `parallel.map_orient`).
+    dedup : bool
+       Whether to compute only the distinct tensors (see `transform.unique_tensors`) and expand the result.
     Returns
     -------
     smat : ndarray
       A (3,3,L,N,M) array of scattering amplitude matrices for each of the `N` scattering angle pairs.
     '''
-    # get basis vectors
-    bas_inc = spherical_basis(phi_1d_sca, np.zeros(len(phi_1d_sca)))
+    if dedup:
+        tens_u, inverse = unique_tensors(alp_tens)
+        smat = ampl_scat_mat_bh(phi_1d_sca, theta_1d_sca, tens_u, k, max_bytes=max_bytes, dtype=dtype,
+                                workers=workers, chunk=chunk, executor=executor)
+        return np.take(smat, inverse, axis=2, out=out)
+    
+    if workers>1:
+        alp_tens = _tensor_3d(alp_tens)
+        task_args = lambda lslice: ((phi_1d_sca, theta_1d_sca, alp_tens[:,:,lslice], k),
+                                    {'max_bytes':max_bytes, 'dtype':dtype})
+        return map_orient(ampl_scat_mat_bh, task_args, alp_tens.shape[2],
+                          (2,2,alp_tens.shape[2],len(phi_1d_sca),len(theta_1d_sca)),
+                          dtype, workers=workers, chunk=chunk, executor=executor, out=out)
+    
+    if out is not None or max_bytes is not None:
+        blocks = iter_ampl_scat_mat_bh(phi_1d_sca, theta_1d_sca, alp_tens, k,
+                                       max_bytes=max_bytes or MAX_BLOCK_BYTES, dtype=dtype)
+        return _fill_blocks(blocks, out, (2,2,_norient(alp_tens),len(phi_1d_sca),len(theta_1d_sca)), dtype)
+    
+    # get basis vectors on the 2d grid for theta and phi scattered
+    rdtype = np.finfo(dtype).dtype
+    bas_inc = grid_basis(phi_1d_sca, 0., dtype=rdtype)[:,:,:,0]
+    bas_sca = grid_basis(phi_1d_sca, theta_1d_sca, dtype=rdtype)
+    smat = _pref(k, dtype)*tensor_scat(np.asarray(alp_tens, dtype=dtype), bas_inc, bas_sca, bh=True)
+    
+    return smat
+
+
+# default memory budget for a block of streamed amplitude matrices
+MAX_BLOCK_BYTES = 2**28
+
+def iter_ampl_scat_mat(phi_inc, theta_inc, phi_sca, theta_sca, alp_tens, k, max_bytes=MAX_BLOCK_BYTES, grid=False, dtype=complex):
+    '''
+    Iterate over blocks of the amplitude scattering matrices from `ampl_scat_mat` so that the full (2,2,L,N,M) array is never held in memory.
     
-    # 2d grid for theta and phi scattered
+    Parameters
+    ----------
+    phi_inc : ndarray (N,)
+        The incident phi angles in radians.
+    theta_inc : ndarray (N,)
+        The incident theta angles in radians.
+    phi_sca : ndarray (M,)
+        The scattered phi angles in radians.
+    theta_sca : ndarray (M,)
+        The scattered theta angles in radians.
+    alp_tens : ndarray
+       A (3,3,L) complex array representing the polarizability tensor.
+    k : float
+       The wave number for the incident wave.
+    max_bytes : int
+       The memory budget in bytes for each block, including temporaries but not the basis vectors built once for all blocks. A block holds at least one orientation and one scattered direction (or theta angle) for all incident directions.
+    grid : bool
+       Whether `phi_sca` and `theta_sca` are the 1D axes of a grid of scattered directions (see `ampl_scat_mat`).
+    dtype : data-type
+       The complex floating point type of the calculation (e.g., `np.complex64` for single precision).
+    Yields
+    ------
+    lslice : slice
+      The slice of orientations in the block.
+    mslice : slice
+      The slice of scattered directions in the block.
+    smat : ndarray
+      The (2,2,l,N,m) block of scattering amplitude matrices.
+    '''
+    rdtype = np.finfo(dtype).dtype
+    bas_inc = spherical_basis(phi_inc, theta_inc, dtype=rdtype)
+    bas_sca = _sca_basis(phi_sca, theta_sca, grid, rdtype)
+    alp_tens = _tensor_3d(np.asarray(alp_tens, dtype=dtype))
+    nori = alp_tens.shape[2]
+    nsca = bas_sca.shape[2]
+    lchunk, mchunk = _block_sizes(nori, bas_inc.shape[2], nsca, max_bytes, dtype)
+    pref = _pref(k, dtype)
+    
+    for l0 in range(0, nori, lchunk):
+        lslice = slice(l0, min(l0+lchunk, nori))
+        for m0 in range(0, nsca, mchunk):
+            mslice = slice(m0, min(m0+mchunk, nsca))
+            smat = tensor_scat(alp_tens[:,:,lslice], bas_inc, bas_sca[:,:,mslice])
+            smat *= pref
+            yield lslice, mslice, smat
+            # release the block before computing the next one
+            del smat
+
+def iter_ampl_scat_mat_bh(phi_1d_sca, theta_1d_sca, alp_tens, k, max_bytes=MAX_BLOCK_BYTES, dtype=complex):
+    '''
+    Iterate over blocks of the amplitude scattering matrices from `ampl_scat_mat_bh` so that the full (2,2,L,N,M) array is never held in memory.
+    
+    Parameters
+    ----------
+    phi_1d_sca : ndarray (N,)
+        The scattering plane angles (phi) in radians.
+    theta_1d_sca : ndarray (M,)
+        The scattered theta angles in radians.
+    alp_tens : ndarray
+       A (3,3,L) complex array representing the polarizability tensor.
+    k : float
+       The wave number for the incident wave.
+    max_bytes : int
+       The memory budget in bytes for each block, including temporaries but not the basis vectors built once for all blocks. A block holds at least one orientation and one scattered direction (or theta angle) for all incident directions.
+    dtype : data-type
+       The complex floating point type of the calculation (e.g., `np.complex64` for single precision).
+    Yields
+    ------
+    lslice : slice
+      The slice of orientations in the block.
+    mslice : slice
+      The slice of scattered theta angles in the block.
+    smat : ndarray
+      The (2,2,l,N,m) block of scattering amplitude matrices.
+    '''
+    rdtype = np.finfo(dtype).dtype
+    bas_inc = grid_basis(phi_1d_sca, 0., dtype=rdtype)[:,:,:,0]
+    bas_sca = grid_basis(phi_1d_sca, theta_1d_sca, dtype=rdtype)
     nphi = len(phi_1d_sca)
     nthet = len(theta_1d_sca)
-    phi2d, theta2d = np.meshgrid(phi_1d_sca, theta_1d_sca, indexing='ij')
-    phi_sca = phi2d.flatten()
-    theta_sca = theta2d.flatten()
     
-    bas_sca = spherical_basis(phi_sca, theta_sca)
-    bas_sca.shape = (3,3,nphi,nthet)
-    smat = 1j*k**3./(4.*np.pi)*tensor_scat(alp_tens, bas_inc, bas_sca, bh=True)
+    alp_tens = _tensor_3d(np.asarray(alp_tens, dtype=dtype))
+    nori = alp_tens.shape[2]
+    lchunk, mchunk = _block_sizes(nori, nphi, nthet, max_bytes, dtype, bh=True)
+    pref = _pref(k, dtype)
     
-    return smat
+    for l0 in range(0, nori, lchunk):
+        lslice = slice(l0, min(l0+lchunk, nori))
+        for m0 in range(0, nthet, mchunk):
+            mslice = slice(m0, min(m0+mchunk, nthet))
+            smat = tensor_scat(alp_tens[:,:,lslice], bas_inc, bas_sca[:,:,:,mslice], bh=True)
+            smat *= pref
+            yield lslice, mslice, smat
+            # release the block before computing the next one
+            del smat
+
+def _pref(k, dtype):
+    # amplitude prefactor as an array so it does not promote single precision results
+    return np.asarray(1j*k**3./(4.*np.pi), dtype=dtype)
+
+def _sca_basis(phi_sca, theta_sca, grid, dtype=float):
+    # scattered basis vectors for a list or a grid of directions
+    if grid:
+        basis = grid_basis(phi_sca, theta_sca, dtype=dtype)
+        return basis.reshape(3,3,-1)
+    return spherical_basis(phi_sca, theta_sca, dtype=dtype)
+
+def _tensor_3d(alp_tens):
+    # (3,3,L) view of a single tensor or a stack of tensors
+    if alp_tens.ndim==2:
+        return alp_tens[:,:,np.newaxis]
+    return alp_tens
+
+def _norient(alp_tens):
+    return 1 if alp_tens.ndim==2 else alp_tens.shape[2]
+
+def _block_sizes(nori, ninc, nsca, max_bytes, dtype=complex, bh=False):
+    # block bytes modelled as ninc*(per_lm*l*m + per_m*m + per_l*l): the output (copied once more by the bh
+    # contraction) and scattered-first intermediates, the basis outer products and the incident-first intermediates,
+    # plus the ufunc buffers (at most one real buffer per input) used when broadcasting the basis outer products
+    csize = np.dtype(dtype).itemsize
+    per_lm = (4*(2 if bh else 1)+6)*csize
+    per_m = 36*csize
+    per_l = 21*csize
+    budget = (max_bytes-np.getbufsize()*csize)/ninc
+    lchunk = int((budget-per_m*nsca)//(per_lm*nsca+per_l))
+    if lchunk>=1:
+        return min(nori, lchunk), nsca
+    return 1, max(1, int((budget-per_l)//(per_lm+per_m)))
+
+def _fill_blocks(blocks, out, shape, dtype=complex):
+    # write streamed blocks into a preallocated (or new) output array
+    if out is None:
+        out = np.empty(shape, dtype=dtype)
+    elif out.shape!=shape:
+        raise ValueError(f'out has shape {out.shape}, expected {shape}')
+    
+    for lslice, mslice, smat in blocks:
+        out[:,:,lslice,...,mslice] = smat
+    return out
+
+@instrumented
+def cov_mat(smat):
+    '''
+    Get the covariance products of the amplitude scattering matrix elements.
+    
+    Parameters
+    ----------
+    smat : ndarray
+      A (2,2,...) array of scattering amplitude matrices.
+    Returns
+    -------
+    cov : ndarray
+      The (2,2,2,2,...) array with `cov[i,j,k,l]` equal to `S_ij S_kl*`. Averaging `cov` over orientations gives the averaged covariance matrix.
+    '''
+    return smat[:,:,np.newaxis,np.newaxis]*np.conj(smat)[np.newaxis,np.newaxis]
+
+@instrumented
+def mueller_mat(cov):
+    '''
+    Get the Mueller (phase) matrices from the covariance products of the amplitude scattering matrices, following Mishchenko et al. (2002).
+    
+    Parameters
+    ----------
+    cov : ndarray
+      The (2,2,2,2,...) array with `cov[i,j,k,l]` equal to (the average of) `S_ij S_kl*` (see `cov_mat`).
+    Returns
+    -------
+    zmat : ndarray
+      The (4,4,...) real array of Mueller matrices for the Stokes vector (I, Q, U, V).
+    '''
+    # Z = A (S kron S*) A^-1
+    amat = np.array([[1.,0.,0.,1.],
+                     [1.,0.,0.,-1.],
+                     [0.,-1.,-1.,0.],
+                     [0.,-1j,1j,0.]])
+    kmat = cov.transpose((0,2,1,3)+tuple(range(4,cov.ndim)))
+    kmat = kmat.reshape((4,4)+cov.shape[4:])
+    zmat = np.einsum('ij,jk...,kl->il...', amat, kmat, np.linalg.inv(amat))
+    return np.real(zmat)
@@ -0,0 +1,149 @@
+import numpy as np
+from .polarizability import ellipsoid
+from .transform import pc_rotate
+from .orientation import orientation_quad
+from .radar import _back_fwd, _moments, _observables
+
+def maxwell_garnett(eps_inc, frac):
+    '''
+    Get the effective permittivity of inclusions in air with the Maxwell Garnett mixing rule.
+    
+    Parameters
+    ----------
+    eps_inc : complex
+        The complex relative permittivity of the inclusions.
+    frac : ndarray
+        The volume fractions of the inclusions.
+    
+    Returns
+    -------
+    eps : ndarray
+        The effective complex relative permittivities.
+    '''
+    kfac = frac*(eps_inc-1.)/(eps_inc+2.)
+    return (1.+2.*kfac)/(1.-kfac)
+
+def bin_moments(diam, k, mass=(2.33e-4, 1.9), aspect=0.6, eps_ice=3.17+0.009j, rho_ice=9.17e-4,
+                canting=0., n_gamma=8, n_beta=8, phi=0., theta=np.pi/2.):
+    '''
+    Get the orientation-averaged scattering moments of oblate spheroids for each size bin.
+    
+    The spheroids have maximum dimension `diam`, a minor-to-major axis ratio from `aspect` and a density from the mass-size relation m = am*D^bm (limited to the ice density), with the permittivity from the Maxwell Garnett rule for ice in air.
+    
+    Parameters
+    ----------
+    diam : ndarray (P,)
+        The maximum dimensions of the size bins.
+    k : float
+        The wave number for the incident wave.
+    mass : tuple
+        The coefficient and exponent of the mass-size relation (default g and mm).
+    aspect : float or callable
+        The axis ratio, or a function returning it from the maximum dimension.
+    eps_ice : complex
+        The complex relative permittivity of ice.
+    rho_ice : float
+        The density of ice in the units of the mass-size relation.
+    canting : float
+        The standard deviation of the canting angles in radians.
+    n_gamma : int
+        The number of azimuthal canting directions when `canting` is nonzero.
+    n_beta : int
+        The number of canting angles when `canting` is nonzero.
+    phi : float
+        The phi angle of the radar beam propagation direction in radians.
+    theta : float
+        The theta angle of the radar beam propagation direction in radians.
+    
+    Returns
+    -------
+    mom : ndarray
+        The (5,P) moments used for the observables.
+    '''
+    diam = np.atleast_1d(diam)
+    ar = aspect(diam) if callable(aspect) else np.full(diam.shape, aspect)
+    frac = np.minimum(mass[0]*diam**mass[1]/(np.pi/6.*diam**3.*ar)/rho_ice, 1.)
+    eps = maxwell_garnett(eps_ice, frac)
+    alp_a, alp_b, alp_c = ellipsoid(diam/2., diam/2., ar*diam/2., eps)
+    
+    # canting angles, where the azimuth of the symmetry axis of a spheroid (pa==pb) is gamma
+    if canting>0.:
+        alpha, beta, gamma, wts = orientation_quad(1, n_beta, n_gamma,
+                                                   beta_pdf=lambda b: np.exp(-0.5*(b/canting)**2.)*np.sin(b),
+                                                   beta_max=min(5.*canting, np.pi))
+    else:
+        alpha, beta, gamma, wts = np.zeros(1), np.zeros(1), np.zeros(1), np.ones(1)
+    nbin, nori = len(diam), len(wts)
+    
+    # tensors for each bin and orientation (3,3,P*O)
+    alp_tens = pc_rotate(*(np.repeat(alp, nori) for alp in (alp_a, alp_b, alp_c)),
+                         *(np.tile(ang, nbin) for ang in (alpha, beta, gamma)))
+    smat_back, smat_fwd = _back_fwd(alp_tens, phi, theta, k)
+    return _moments(smat_back, smat_fwd, k).reshape(5, nbin, nori)@wts
+
+def bulk_radar(n0, mu, lam, k, dmin, dmax, nquad=32, chunk=256, kw2=0.93, out=None, **kwargs):
+    '''
+    Get bulk polarimetric radar observables over a grid of gamma particle size distributions N(D) = n0*D^mu*exp(-lam*D).
+    
+    The size integrals use Gauss-Legendre quadrature between `dmin` and `dmax`. The scattering moments are computed once for the quadrature nodes and the grid is processed in chunks of columns, so memory use is bounded by the chunk size.
+    
+    Parameters
+    ----------
+    n0 : ndarray
+        The intercept parameters, as scalars or arrays broadcasting to the grid shape (..., Z) with the vertical levels along the last axis.
+    mu : ndarray
+        The shape parameters.
+    lam : ndarray
+        The slope parameters.
+    k : float
+        The wave number for the incident wave.
+    dmin : float
+        The minimum maximum dimension of the integral.
+    dmax : float
+        The maximum maximum dimension of the integral.
+    nquad : int
+        The number of quadrature nodes.
+    chunk : int
+        The number of grid columns in each chunk.
+    kw2 : float
+        The dielectric factor |K_w|^2 for the reflectivity.
+    out : dict, optional
+        Preallocated contiguous arrays of the grid shape (e.g., memory maps) for the observables.
+    **kwargs
+        Particle properties passed to `bin_moments`.
+    
+    Returns
+    -------
+    obs : dict
+        The observables (see `radar.radar_obs`) over the grid.
+    '''
+    x, wts = np.polynomial.legendre.leggauss(nquad)
+    diam = 0.5*(dmax-dmin)*x+0.5*(dmax+dmin)
+    wts = 0.5*(dmax-dmin)*wts
+    bin_mom = bin_moments(diam, k, **kwargs)*wts
+    
+    shape = np.broadcast_shapes(*(np.shape(p) for p in (n0, mu, lam)))
+    if len(shape)==0:
+        shape = (1,)
+    params = [p if np.ndim(p)==0 else np.broadcast_to(p, shape) for p in (n0, mu, lam)]
+    if out is None:
+        out = {key:np.empty(shape) for key in ('zh', 'zdr', 'ldr', 'kdp', 'rhohv')}
+    for key, arr in out.items():
+        if arr.shape!=shape or not arr.flags.c_contiguous:
+            raise ValueError(f'out[{key!r}] must be a contiguous array of shape {shape}')
+    flat = {key:np.reshape(arr, (-1, shape[-1])) for key, arr in out.items()}
+    
+    ncol = int(np.prod(shape[:-1]))
+    for c0 in range(0, ncol, chunk):
+        # gather the chunk columns from the broadcast parameters without expanding the whole grid
+        cols = np.unravel_index(np.arange(c0, min(c0+chunk, ncol)), shape[:-1]) if len(shape)>1 else ()
+        n0_c, mu_c, lam_c = (p if np.ndim(p)==0 else np.asarray(p[cols])[...,np.newaxis] for p in params)
+        
+        # size distribution at the nodes (C,Z,P)
+        ndist = n0_c*diam**mu_c*np.exp(-lam_c*diam)
+        ndist = np.broadcast_to(ndist, (min(chunk, ncol-c0), shape[-1], nquad))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            obs = _observables(np.moveaxis(ndist@bin_mom.T, -1, 0), k, kw2)
+        for key in flat:
+            flat[key][c0:c0+chunk] = obs[key]
+    return out
@@ -0,0 +1,151 @@
+'''
+Opt-in timing of the hot paths.
+
+Functions decorated with `instrumented` record their wall time, argument and result sizes (and optionally the bytes allocated) while a `Profile` is active:
+
+    with instrument.Profile() as prof:
+        fields.ampl_scat_mat(...)
+    prof.summary()
+    prof.to_chrome_trace('trace.json')
+
+Without an active profile the decorated functions only check one global before calling through.
+'''
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+import numpy as np
+
+# the profile collecting records, if any
+_active = None
+
+def instrumented(func):
+    '''
+    Decorate a function so its calls are recorded by the active profile.
+    '''
+    name = func.__module__.split('.')[-1]+'.'+func.__qualname__
+    
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if _active is None:
+            return func(*args, **kwargs)
+        return _active._call(name, func, args, kwargs)
+    return wrapper
+
+def _nbytes(obj):
+    # bytes of the arrays in an argument or result
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if isinstance(obj, (tuple, list)):
+        return sum(_nbytes(item) for item in obj)
+    return 0
+
+class Profile:
+    '''
+    A context manager collecting the calls of instrumented functions.
+    
+    Parameters
+    ----------
+    memory : bool
+        Whether to record the peak bytes allocated during each call with `tracemalloc`, which slows the calls down and is only accurate for single-threaded runs.
+    
+    Attributes
+    ----------
+    records : list
+        One dict per call with the function `'name'`, start time `'start'` and duration `'time'` in seconds, nesting `'depth'`, thread `'thread'`, argument array shapes `'shapes'`, argument and result array bytes `'in_bytes'` and `'out_bytes'` and, with `memory=True`, the allocated bytes `'alloc'`.
+    '''
+    def __init__(self, memory=False):
+        self.memory = memory
+        self.records = []
+        self._depth = threading.local()
+        self._peaks = []
+        self._prev = None
+        self._tracing = False
+    
+    def __enter__(self):
+        global _active
+        self._prev = _active
+        self._t0 = time.perf_counter()
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracing = True
+        _active = self
+        return self
+    
+    def __exit__(self, *exc):
+        global _active
+        _active = self._prev
+        if self._tracing:
+            tracemalloc.stop()
+            self._tracing = False
+        return False
+    
+    def _call(self, name, func, args, kwargs):
+        depth = getattr(self._depth, 'value', 0)
+        self._depth.value = depth+1
+        if self.memory:
+            cur0, peak_prev = tracemalloc.get_traced_memory()
+            if self._peaks:
+                self._peaks[-1] = max(self._peaks[-1], peak_prev)
+            tracemalloc.reset_peak()
+            self._peaks.append(0)
+        
+        t0 = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            t1 = time.perf_counter()
+            self._depth.value = depth
+            if self.memory:
+                peak = max(tracemalloc.get_traced_memory()[1], self._peaks.pop())
+                if self._peaks:
+                    self._peaks[-1] = max(self._peaks[-1], peak)
+        
+        record = {'name':name, 'start':t0-self._t0, 'time':t1-t0, 'depth':depth, 'thread':threading.get_ident(),
+                  'shapes':[list(np.shape(arg)) for arg in args if isinstance(arg, np.ndarray)],
+                  'in_bytes':_nbytes(args)+_nbytes(list(kwargs.values())), 'out_bytes':_nbytes(result)}
+        if self.memory:
+            record['alloc'] = peak-cur0
+        self.records.append(record)
+        return result
+    
+    def summary(self):
+        '''
+        Get the call count, total and maximum time and total bytes for each function.
+        
+        Returns
+        -------
+        summary : dict
+            The statistics keyed by function name, ordered by decreasing total time.
+        '''
+        stats = {}
+        for rec in self.records:
+            st = stats.setdefault(rec['name'], {'calls':0, 'time':0., 'max_time':0., 'in_bytes':0, 'out_bytes':0})
+            st['calls'] += 1
+            st['time'] += rec['time']
+            st['max_time'] = max(st['max_time'], rec['time'])
+            st['in_bytes'] += rec['in_bytes']
+            st['out_bytes'] += rec['out_bytes']
+            if 'alloc' in rec:
+                st['alloc'] = max(st.get('alloc', 0), rec['alloc'])
+        return dict(sorted(stats.items(), key=lambda item: -item[1]['time']))
+    
+    def to_json(self, fname):
+        '''
+        Write the summary and the call records to a JSON file.
+        '''
+        with open(fname, 'w') as f:
+            json.dump({'summary':self.summary(), 'records':self.records}, f, indent=1)
+    
+    def to_chrome_trace(self, fname):
+        '''
+        Write the calls as complete events in the Chrome trace format (e.g., for chrome://tracing or Perfetto).
+        '''
+        events = [{'name':rec['name'], 'ph':'X', 'ts':rec['start']*1.e6, 'dur':rec['time']*1.e6,
+                   'pid':os.getpid(), 'tid':rec['thread'],
+                   'args':{key:rec[key] for key in ('shapes', 'in_bytes', 'out_bytes', 'alloc') if key in rec}}
+                  for rec in self.records]
+        with open(fname, 'w') as f:
+            json.dump({'traceEvents':events, 'displayTimeUnit':'ms'}, f)
@@ -0,0 +1,101 @@
+import numpy as np
+from .polarizability import ellipsoid
+from .transform import pc_rotate
+from .fields import ampl_scat_mat
+from .vectors import spherical_basis
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+def fused_scat(a, b, c, eps, alpha, beta, gamma, phi_inc, theta_inc, phi_sca, theta_sca, k, backend='auto',
+               table=None):
+    '''
+    Get the amplitude scattering matrices of ellipsoids, equivalent to `polarizability.ellipsoid`, `transform.pc_rotate` and `fields.ampl_scat_mat` in sequence.
+    
+    The `'numba'` backend rotates and scatters each particle in one compiled loop without full-size intermediate arrays. The `'numpy'` backend chains the NumPy functions.
+    
+    Parameters
+    ----------
+    a : ndarray (L,)
+        The a axis lengths.
+    b : ndarray (L,)
+        The b axis lengths.
+    c : ndarray (L,)
+        The c axis lengths.
+    eps : ndarray (L,)
+        The complex relative permittivities.
+    alpha : ndarray (L,)
+        The first Euler angles (zyz convention, radians).
+    beta : ndarray (L,)
+        The second Euler angles.
+    gamma : ndarray (L,)
+        The third Euler angles.
+    phi_inc : ndarray (N,)
+        The incident phi angles in radians.
+    theta_inc : ndarray (N,)
+        The incident theta angles in radians.
+    phi_sca : ndarray (M,)
+        The scattered phi angles in radians.
+    theta_sca : ndarray (M,)
+        The scattered theta angles in radians.
+    k : float
+        The wave number for the incident wave.
+    backend : str
+        `'numba'`, `'numpy'` or `'auto'` for numba when it is installed.
+    table : dict, optional
+        A shape factor table (see `polarizability.shape_factor_table`).
+    
+    Returns
+    -------
+    smat : ndarray
+        The (2,2,L,N,M) amplitude scattering matrices.
+    '''
+    if backend=='auto':
+        backend = 'numpy' if numba is None else 'numba'
+    alp_a, alp_b, alp_c = ellipsoid(a, b, c, eps, table=table)
+    if backend=='numpy':
+        return ampl_scat_mat(phi_inc, theta_inc, phi_sca, theta_sca, pc_rotate(alp_a, alp_b, alp_c, alpha, beta, gamma), k)
+    if backend!='numba':
+        raise ValueError(f'unknown backend {backend}')
+    if numba is None:
+        raise ImportError('the numba backend requires numba')
+    
+    # v and h basis vectors (2,3,N) and (2,3,M) are shared by all particles
+    pvals = np.array(np.broadcast_arrays(*np.atleast_1d(alp_a, alp_b, alp_c, alpha, beta, gamma)))
+    bas_inc = np.ascontiguousarray(np.moveaxis(spherical_basis(phi_inc, theta_inc)[:,:2], 1, 0))
+    bas_sca = np.ascontiguousarray(np.moveaxis(spherical_basis(phi_sca, theta_sca)[:,:2], 1, 0))
+    smat = np.empty((2,2,pvals.shape[1],bas_inc.shape[2],bas_sca.shape[2]), dtype=complex)
+    _scat_loop_jit(np.ascontiguousarray(pvals[:3]), np.ascontiguousarray(pvals[3:].real), bas_inc, bas_sca,
+                   1j*k**3./(4.*np.pi), smat)
+    return smat
+
+def _scat_loop(pvals, angles, bas_inc, bas_sca, pref, smat):
+    # rotate each tensor and contract it with the v and h basis vectors of every direction pair
+    rmat = np.empty((3,3))
+    tens = np.empty((3,3), dtype=np.complex128)
+    tinc = np.empty((3,2), dtype=np.complex128)
+    for l in range(pvals.shape[1]):
+        ca, sa = np.cos(angles[0,l]), np.sin(angles[0,l])
+        cb, sb = np.cos(angles[1,l]), np.sin(angles[1,l])
+        cg, sg = np.cos(angles[2,l]), np.sin(angles[2,l])
+        rmat[0,0], rmat[0,1], rmat[0,2] = ca*cb*cg-sa*sg, -ca*cb*sg-sa*cg, ca*sb
+        rmat[1,0], rmat[1,1], rmat[1,2] = sa*cb*cg+ca*sg, -sa*cb*sg+ca*cg, sa*sb
+        rmat[2,0], rmat[2,1], rmat[2,2] = -sb*cg, sb*sg, cb
+        for j in range(3):
+            for q in range(j,3):
+                tens[j,q] = pvals[0,l]*(rmat[0,j]*rmat[0,q])+pvals[1,l]*(rmat[1,j]*rmat[1,q])+pvals[2,l]*(rmat[2,j]*rmat[2,q])
+                tens[q,j] = tens[j,q]
+        
+        for n in range(bas_inc.shape[2]):
+            for j in range(3):
+                for p in range(2):
+                    tinc[j,p] = pref*(tens[j,0]*bas_inc[p,0,n]+tens[j,1]*bas_inc[p,1,n]+tens[j,2]*bas_inc[p,2,n])
+            for i in range(2):
+                for p in range(2):
+                    t0, t1, t2 = tinc[0,p], tinc[1,p], tinc[2,p]
+                    for m in range(bas_sca.shape[2]):
+                        smat[i,p,l,n,m] = bas_sca[i,0,m]*t0+bas_sca[i,1,m]*t1+bas_sca[i,2,m]*t2
+
+_scat_loop_jit = _scat_loop if numba is None else numba.njit(cache=False)(_scat_loop)
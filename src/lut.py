@@ -0,0 +1,150 @@
+import numpy as np
+import json
+import os
+from .polarizability import ellipsoid
+from .transform import pc_rotate
+from .fields import ampl_scat_mat_bh
+
+# file layout: magic, header length, JSON header, completion index, the binary parameter arrays, then the
+# (P,2,2,L,Nphi,Ntheta) amplitude matrices
+MAGIC = b'RAYLUT02'
+ALIGN = 64
+
+def _align(nbytes):
+    return -(-nbytes//ALIGN)*ALIGN
+
+def _read_header(fname):
+    with open(fname, 'rb') as f:
+        if f.read(len(MAGIC))!=MAGIC:
+            raise ValueError(f'{fname} is not a rayleighpy lookup table')
+        hlen = int(np.frombuffer(f.read(8), dtype='<u8')[0])
+        return json.loads(f.read(hlen).decode())
+
+def _create(fname, header, arrays):
+    # size the header with placeholder offsets, then lay out the index, parameter and data regions after it
+    nentry = header['shape'][0]
+    header['arrays'] = {name:{'offset':0, 'dtype':arr.dtype.str, 'length':len(arr)} for name, arr in arrays.items()}
+    header['index_offset'] = header['data_offset'] = 0
+    hlen = _align(len(MAGIC)+8+len(json.dumps(header).encode())+256)-len(MAGIC)-8
+    header['index_offset'] = len(MAGIC)+8+hlen
+    offset = _align(header['index_offset']+nentry)
+    for name, arr in arrays.items():
+        header['arrays'][name]['offset'] = offset
+        offset = _align(offset+arr.nbytes)
+    header['data_offset'] = offset
+    hbytes = json.dumps(header).encode()
+    if len(hbytes)>hlen:
+        raise RuntimeError('lookup table header does not fit')
+    
+    nbytes = int(np.prod(header['shape']))*np.dtype(header['dtype']).itemsize
+    with open(fname, 'wb') as f:
+        f.write(MAGIC)
+        f.write(np.array(hlen, dtype='<u8').tobytes())
+        f.write(hbytes.ljust(hlen))
+        for name, arr in arrays.items():
+            f.seek(header['arrays'][name]['offset'])
+            f.write(arr.tobytes())
+        f.truncate(header['data_offset']+nbytes)
+
+def _region(buf, offset, dtype, shape):
+    # typed view of a region of the mapped file
+    nbytes = int(np.prod(shape))*np.dtype(dtype).itemsize
+    return buf[offset:offset+nbytes].view(dtype).reshape(shape)
+
+def open_lut(fname, mode='r'):
+    '''
+    Open a lookup table of amplitude scattering matrices without reading the data.
+    
+    Parameters
+    ----------
+    fname : str
+        The lookup table file.
+    mode : str
+        The `numpy.memmap` mode, `'r'` to read or `'r+'` to update.
+    
+    Returns
+    -------
+    lut : dict
+        The table with the `'header'` dict (shapes, types and offsets), the memory mapped particle parameters, orientations and angle grids `'arrays'` (`'a'`, `'b'`, `'c'`, `'eps'`, `'k'`, `'alpha'`, `'beta'`, `'gamma'`, `'phi'` and `'theta'`), the memory mapped (P,2,2,L,Nphi,Ntheta) amplitude matrices `'smat'` and the (P,) completion flags `'done'`.
+    '''
+    header = _read_header(fname)
+    nentry = header['shape'][0]
+    
+    # one mapping of the whole file with typed views of each region
+    buf = np.memmap(fname, dtype=np.uint8, mode=mode)
+    done = _region(buf, header['index_offset'], np.uint8, (nentry,))
+    arrays = {name:_region(buf, info['offset'], info['dtype'], (info['length'],)) for name, info in header['arrays'].items()}
+    smat = _region(buf, header['data_offset'], header['dtype'], tuple(header['shape']))
+    return {'header':header, 'arrays':arrays, 'smat':smat, 'done':done}
+
+def build_lut(fname, a, b, c, eps, k, alpha, beta, gamma, phi_1d_sca, theta_1d_sca, dtype=complex, max_entries=None):
+    '''
+    Build (or resume building) a lookup table of amplitude scattering matrices from `fields.ampl_scat_mat_bh` for a list of particles on a fixed orientation and angle grid.
+    
+    Each particle entry is written and flushed before it is marked complete, so an interrupted build continues from the first incomplete entry when called again with the same arguments.
+    
+    Parameters
+    ----------
+    fname : str
+        The lookup table file.
+    a : ndarray (P,)
+        The a axis lengths.
+    b : ndarray (P,)
+        The b axis lengths.
+    c : ndarray (P,)
+        The c axis lengths.
+    eps : ndarray (P,)
+        The complex relative permittivities.
+    k : ndarray (P,)
+        The wave numbers.
+    alpha : ndarray (L,)
+        The first Euler angles of the orientations (zyz convention, radians).
+    beta : ndarray (L,)
+        The second Euler angles of the orientations.
+    gamma : ndarray (L,)
+        The third Euler angles of the orientations.
+    phi_1d_sca : ndarray (Nphi,)
+        The scattering plane angles (phi) in radians.
+    theta_1d_sca : ndarray (Ntheta,)
+        The scattered theta angles in radians.
+    dtype : data-type
+        The complex type of the stored amplitude matrices.
+    max_entries : int, optional
+        The largest number of entries to compute in this call, for incremental builds.
+    
+    Returns
+    -------
+    ndone : int
+        The number of completed entries in the table.
+    '''
+    a, b, c, eps, k = np.broadcast_arrays(*np.atleast_1d(a, b, c, eps, k))
+    alpha, beta, gamma = np.broadcast_arrays(*np.atleast_1d(alpha, beta, gamma))
+    header = {'version':2,
+              'dtype':np.dtype(dtype).str,
+              'shape':[len(a),2,2,len(alpha),len(phi_1d_sca),len(theta_1d_sca)]}
+    arrays = {name:np.ascontiguousarray(arr, dtype=dt) for name, arr, dt in
+              [('a', a, '<f8'), ('b', b, '<f8'), ('c', c, '<f8'), ('eps', eps, '<c16'), ('k', k, '<f8'),
+               ('alpha', alpha, '<f8'), ('beta', beta, '<f8'), ('gamma', gamma, '<f8'),
+               ('phi', np.atleast_1d(phi_1d_sca), '<f8'), ('theta', np.atleast_1d(theta_1d_sca), '<f8')]}
+    
+    if os.path.exists(fname):
+        old = open_lut(fname)
+        if (any(old['header'].get(key)!=header[key] for key in header) or old['arrays'].keys()!=arrays.keys() or
+                not all(np.array_equal(old['arrays'][name], arr) for name, arr in arrays.items())):
+            raise ValueError(f'{fname} was built with different parameters')
+        del old
+    else:
+        _create(fname, header, arrays)
+    
+    lut = open_lut(fname, mode='r+')
+    todo = np.flatnonzero(lut['done']==0)
+    if max_entries is not None:
+        todo = todo[:max_entries]
+    for ip in todo:
+        alp_a, alp_b, alp_c = ellipsoid(a[ip], b[ip], c[ip], eps[ip])
+        alp_tens = pc_rotate(alp_a, alp_b, alp_c, alpha, beta, gamma, dtype=dtype)
+        ampl_scat_mat_bh(phi_1d_sca, theta_1d_sca, alp_tens, k[ip], out=lut['smat'][ip], dtype=dtype)
+        lut['smat'].flush()
+        lut['done'][ip] = 1
+        lut['done'].flush()
+    return int(np.sum(lut['done']))
@@ -0,0 +1,277 @@
+import numpy as np
+import warnings
+from .vectors import spherical_basis
+from .transform import pc_rotate
+
+def orientation_average(alpha_a, alpha_b, alpha_c, phi_inc, theta_inc, phi_sca, theta_sca, k, mueller=False):
+    '''
+    Get the covariance matrices of the amplitude scattering matrices averaged over uniformly random orientations directly from the principal polarizabilities.
+    
+    Parameters
+    ----------
+    alpha_a : float complex, ndarray (P,)
+        The polarizability along the a axis of the particles.
+    alpha_b : float complex, ndarray (P,)
+        The polarizability along the b axis of the particles.
+    alpha_c : float complex, ndarray (P,)
+        The polarizability along the c axis of the particles.
+    phi_inc : ndarray (N,)
+        The incident phi angles in radians.
+    theta_inc : ndarray (N,)
+        The incident theta angles in radians.
+    phi_sca : ndarray (M,)
+        The scattered phi angles in radians.
+    theta_sca : ndarray (M,)
+        The scattered theta angles in radians.
+    k : float
+       The wave number for the incident wave.
+    mueller : bool
+       Whether to return the averaged Mueller matrices instead of the covariance matrices.
+    
+    Returns
+    -------
+    cov : ndarray
+      The (2,2,2,2,P,N,M) array with `cov[i,j,k,l]` equal to the orientation average of `S_ij S_kl*`. If `mueller=True`, the (4,4,P,N,M) array of averaged Mueller matrices.
+    '''
+    # isotropic and deviatoric parts of the principal polarizabilities
+    alp = np.array(np.broadcast_arrays(*np.atleast_1d(alpha_a, alpha_b, alpha_c)), dtype=complex)
+    alp_iso = np.mean(alp, axis=0)
+    dev2 = np.sum(np.abs(alp-alp_iso)**2., axis=0)
+    
+    # <A_ab A_cd*> = c1 d_ab d_cd + c2 (d_ac d_bd + d_ad d_bc)
+    c1 = np.abs(alp_iso)**2.-dev2/15.
+    c2 = dev2/10.
+    
+    # dot products between the incident and scattered basis vectors
+    vh_inc = spherical_basis(phi_inc, theta_inc)[:,:2,:]
+    vh_sca = spherical_basis(phi_sca, theta_sca)[:,:2,:]
+    dot_si = np.einsum('ail,ajk->ijkl', vh_sca, vh_inc)
+    dot_ss = np.einsum('ail,ajl->ijl', vh_sca, vh_sca)
+    dot_ii = np.einsum('aik,ajk->ijk', vh_inc, vh_inc)
+    
+    iso = np.einsum('ijnm,klnm->ijklnm', dot_si, dot_si)
+    dev = (np.einsum('ikm,jln->ijklnm', dot_ss, dot_ii)+
+           np.einsum('ilnm,kjnm->ijklnm', dot_si, dot_si))
+    cov = (k**6./(16.*np.pi**2.)*(c1[:,np.newaxis,np.newaxis]*iso[:,:,:,:,np.newaxis]+
+                                  c2[:,np.newaxis,np.newaxis]*dev[:,:,:,:,np.newaxis]))
+    
+    if mueller:
+        from .fields import mueller_mat
+        return mueller_mat(cov)
+    return cov
+
+
+def orientation_quad(n_alpha, n_beta, n_gamma, beta_pdf=None, beta_max=np.pi):
+    '''
+    Get Euler angles and weights of a product quadrature over orientations with the canting (beta) angles following a given distribution.
+    
+    The alpha and gamma angles use the trapezoid rule, which is spectrally accurate for periodic integrands, and the beta angles use Gauss-Legendre nodes.
+    
+    Parameters
+    ----------
+    n_alpha : int
+        The number of first Euler angles.
+    n_beta : int
+        The number of second Euler angles.
+    n_gamma : int
+        The number of third Euler angles.
+    beta_pdf : callable, optional
+        The probability density of beta in radians (including any sin(beta) factor). The default is uniformly random orientations, with nodes in cos(beta).
+    beta_max : float
+        The upper limit of the beta angles when `beta_pdf` is given.
+    
+    Returns
+    -------
+    alpha : ndarray
+        The (n_alpha*n_beta*n_gamma,) first Euler angles (zyz convention, radians).
+    beta : ndarray
+        The second Euler angles.
+    gamma : ndarray
+        The third Euler angles.
+    weights : ndarray
+        The quadrature weights, which sum to one.
+    '''
+    alpha_1d = np.arange(n_alpha)*2.*np.pi/n_alpha
+    gamma_1d = np.arange(n_gamma)*2.*np.pi/n_gamma
+    x, wts = np.polynomial.legendre.leggauss(n_beta)
+    if beta_pdf is None:
+        beta_1d = np.arccos(-x)
+    else:
+        beta_1d = 0.5*beta_max*(x+1.)
+        wts = wts*beta_pdf(beta_1d)
+    wts = wts/np.sum(wts)
+    
+    alpha, beta, gamma = np.meshgrid(alpha_1d, beta_1d, gamma_1d, indexing='ij')
+    weights = np.broadcast_to(wts[np.newaxis,:,np.newaxis], alpha.shape)/(n_alpha*n_gamma)
+    return alpha.flatten(), beta.flatten(), gamma.flatten(), weights.flatten()
+
+def orientation_integrate(func, pa, pb, pc, beta_pdf=None, beta_max=np.pi, axis=2, rtol=1.e-6, atol=0., n_init=4, n_max=64):
+    '''
+    Average a function of the rotated polarizability tensor over a canting distribution, refining the quadrature until the average converges.
+    
+    Parameters
+    ----------
+    func : callable
+        A function taking a (3,3,L) tensor array (see `transform.pc_rotate`) and returning an array with the `L` orientations along `axis` (e.g., a wrapper around `fields.ampl_scat_mat` and `fields.cov_mat`).
+    pa : float complex
+        The value along principal axis a.
+    pb : float complex
+        The value along principal axis b.
+    pc : float complex
+        The value along principal axis c.
+    beta_pdf : callable, optional
+        The probability density of beta (see `orientation_quad`). The default is uniformly random orientations.
+    beta_max : float
+        The upper limit of the beta angles when `beta_pdf` is given.
+    axis : int
+        The orientation axis of the output of `func`.
+    rtol : float
+        The relative tolerance for convergence.
+    atol : float
+        The absolute tolerance for convergence.
+    n_init : int
+        The initial number of nodes for each Euler angle.
+    n_max : int
+        The maximum number of nodes for each Euler angle.
+    
+    Returns
+    -------
+    avg : ndarray
+        The weighted average of `func` over orientations.
+    nori : int
+        The number of orientations in the final quadrature.
+    '''
+    avg_prev = None
+    n = n_init
+    while True:
+        alpha, beta, gamma, weights = orientation_quad(n, n, n, beta_pdf=beta_pdf, beta_max=beta_max)
+        avg = np.tensordot(func(pc_rotate(pa, pb, pc, alpha, beta, gamma)), weights, axes=([axis],[0]))
+        if avg_prev is not None and np.all(np.abs(avg-avg_prev)<=atol+rtol*np.max(np.abs(avg))):
+            return avg, len(weights)
+        if 2*n>n_max:
+            warnings.warn(f'orientation average did not converge with {n} nodes per angle')
+            return avg, len(weights)
+        avg_prev = avg
+        n = 2*n
+
+class OrientationAccumulator:
+    '''
+    Running mean and variance of samples over random orientations, updated batch by batch with the Welford (Chan et al.) update so memory does not grow with the number of orientations.
+    
+    Attributes
+    ----------
+    count : int
+        The number of orientations accumulated.
+    mean : ndarray
+        The running mean.
+    m2 : ndarray
+        The running sum of squared magnitudes of deviations from the mean.
+    '''
+    def __init__(self):
+        self.count = 0
+        self.mean = None
+        self.m2 = None
+    
+    def update(self, batch, axis=2):
+        '''
+        Add a batch of samples with the orientations along `axis`.
+        '''
+        batch = np.moveaxis(np.asarray(batch), axis, 0)
+        nbatch = batch.shape[0]
+        mean_b = np.mean(batch, axis=0)
+        m2_b = np.sum(np.abs(batch-mean_b)**2., axis=0)
+        if self.count==0:
+            self.count, self.mean, self.m2 = nbatch, mean_b, m2_b
+            return
+        
+        # combine the batch statistics with the running statistics
+        total = self.count+nbatch
+        delta = mean_b-self.mean
+        self.mean = self.mean+delta*nbatch/total
+        self.m2 = self.m2+m2_b+np.abs(delta)**2.*self.count*nbatch/total
+        self.count = total
+    
+    @property
+    def var(self):
+        '''
+        The sample variance of each element.
+        '''
+        return self.m2/max(self.count-1, 1)
+    
+    @property
+    def sem(self):
+        '''
+        The standard error of the mean of each element.
+        '''
+        return np.sqrt(self.var/max(self.count, 1))
+    
+    def converged(self, rtol=1.e-3, atol=0.):
+        '''
+        Whether the standard errors of all elements are within the tolerance, relative to the largest mean magnitude.
+        '''
+        return self.count>1 and bool(np.all(self.sem<=atol+rtol*np.max(np.abs(self.mean))))
+
+def random_orientations(pa, pb, pc, batch=1000, n_max=None, rng=None):
+    '''
+    Generate batches of tensors (see `transform.pc_rotate`) for uniformly random orientations.
+    
+    Parameters
+    ----------
+    pa : float complex
+        The value along principal axis a.
+    pb : float complex
+        The value along principal axis b.
+    pc : float complex
+        The value along principal axis c.
+    batch : int
+        The number of orientations in each batch.
+    n_max : int, optional
+        The total number of orientations, after which the generator stops. The default never stops.
+    rng : numpy.random.Generator, optional
+        The random number generator.
+    
+    Yields
+    ------
+    alp_tens : ndarray
+        The (3,3,batch) tensors.
+    '''
+    rng = np.random.default_rng(rng)
+    count = 0
+    while n_max is None or count<n_max:
+        nbatch = batch if n_max is None else min(batch, n_max-count)
+        alpha, gamma = rng.random((2,nbatch))*2.*np.pi
+        beta = np.arccos(rng.uniform(-1., 1., nbatch))
+        yield pc_rotate(pa, pb, pc, alpha, beta, gamma)
+        count += nbatch
+
+def orientation_stream(func, batches, axis=2, rtol=1.e-3, atol=0., n_min=2):
+    '''
+    Average a function of tensor batches from a generator, stopping once the standard errors of the average are within the tolerance.
+    
+    Parameters
+    ----------
+    func : callable
+        A function taking a (3,3,L) tensor array and returning an array with the `L` orientations along `axis` (e.g., a wrapper around `fields.ampl_scat_mat` and `fields.mueller_mat`).
+    batches : iterable
+        The (3,3,L) tensor batches (e.g., from `random_orientations`).
+    axis : int
+        The orientation axis of the output of `func`.
+    rtol : float
+        The tolerance of the standard errors relative to the largest mean magnitude.
+    atol : float
+        The absolute tolerance of the standard errors.
+    n_min : int
+        The minimum number of batches before testing for convergence.
+    
+    Returns
+    -------
+    acc : OrientationAccumulator
+        The accumulated mean, variance and standard error.
+    '''
+    acc = OrientationAccumulator()
+    for ibatch, alp_tens in enumerate(batches):
+        acc.update(func(alp_tens), axis=axis)
+        if ibatch+1>=n_min and acc.converged(rtol=rtol, atol=atol):
+            return acc
+    warnings.warn(f'orientation average did not converge with {acc.count} orientations')
+    return acc
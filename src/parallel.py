@@ -0,0 +1,97 @@
+import mmap
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+
+def map_orient(func, task_args, nori, shape, dtype, axis=2, workers=2, chunk=None, executor='thread', out=None):
+    '''
+    Split a calculation over the orientation (or particle) axis across a pool of workers that write into one result array.
+    
+    Parameters
+    ----------
+    func : callable
+        The function computing the result for a block of orientations. It must be defined at module level for `executor='process'`.
+    task_args : callable
+        A function taking the slice of orientations and returning the `(args, kwargs)` of `func` for that block.
+    nori : int
+        The number of orientations `L`.
+    shape : tuple
+        The shape of the full result.
+    dtype : data-type
+        The type of the full result.
+    axis : int
+        The orientation axis of the result.
+    workers : int
+        The number of threads or processes.
+    chunk : int, optional
+        The number of orientations for each task. The default gives four tasks per worker.
+    executor : str
+        `'thread'` for a thread pool (NumPy releases the GIL in the contractions) or `'process'` for a process pool. Process workers write directly into `out` when it is a writable, contiguous `np.memmap` of a whole file region (e.g., from `np.memmap` or `np.lib.format.open_memmap`, not a slice of one), which they open themselves. Otherwise they write into shared memory that is copied into the result at the end, so the result is held twice at the peak.
+    out : ndarray, optional
+        A preallocated array for the result.
+    
+    Returns
+    -------
+    out : ndarray
+        The full result.
+    '''
+    if chunk is None:
+        chunk = max(1, -(-nori//(4*workers)))
+    slices = [slice(l0, min(l0+chunk, nori)) for l0 in range(0, nori, chunk)]
+    if out is None:
+        out = np.empty(shape, dtype=dtype)
+    elif out.shape!=tuple(shape):
+        raise ValueError(f'out has shape {out.shape}, expected {tuple(shape)}')
+    
+    if executor=='thread':
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            tasks = [pool.submit(_fill_task, out, lslice, axis, func, *task_args(lslice)) for lslice in slices]
+            for task in tasks:
+                task.result()
+    elif executor=='process' and _file_backed(out):
+        order = 'C' if out.flags.c_contiguous else 'F'
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            tasks = [pool.submit(_memmap_task, out.filename, out.offset, shape, out.dtype, order, lslice, axis, func,
+                                 *task_args(lslice)) for lslice in slices]
+            for task in tasks:
+                task.result()
+    elif executor=='process':
+        shm = SharedMemory(create=True, size=max(1, int(np.prod(shape))*np.dtype(dtype).itemsize))
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                tasks = [pool.submit(_shm_task, shm.name, shape, dtype, lslice, axis, func, *task_args(lslice))
+                         for lslice in slices]
+                for task in tasks:
+                    task.result()
+            out[...] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        finally:
+            shm.close()
+            shm.unlink()
+    else:
+        raise ValueError(f'unknown executor {executor}')
+    return out
+
+def _fill_task(out, lslice, axis, func, args, kwargs):
+    out[(slice(None),)*axis+(lslice,)] = func(*args, **kwargs)
+
+def _shm_task(name, shape, dtype, lslice, axis, func, args, kwargs):
+    # attach to the shared result array in a worker process
+    shm = SharedMemory(name=name)
+    try:
+        out = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        _fill_task(out, lslice, axis, func, args, kwargs)
+        del out
+    finally:
+        shm.close()
+
+def _file_backed(out):
+    # whether out maps a whole file region that worker processes can open and write themselves
+    return (isinstance(out, np.memmap) and isinstance(out.base, mmap.mmap) and out.filename is not None
+            and out.mode in ('r+', 'w+') and (out.flags.c_contiguous or out.flags.f_contiguous))
+
+def _memmap_task(filename, offset, shape, dtype, order, lslice, axis, func, args, kwargs):
+    # open the memory-mapped result file in a worker process
+    out = np.memmap(filename, dtype=dtype, mode='r+', offset=offset, shape=shape, order=order)
+    _fill_task(out, lslice, axis, func, args, kwargs)
+    out.flush()
+    del out
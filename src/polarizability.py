@@ -1,21 +1,27 @@
 import numpy as np
+import os
+from functools import lru_cache
 from scipy.special import elliprd
+from .instrument import instrumented
 
 # polarizability for ellipsoid
-def ellipsoid(a, b, c, eps):
+@instrumented
+def ellipsoid(a, b, c, eps, table=None):
     '''
     Get the polarizabilities for an ellipsoid.
     
     Parameters
     ----------
-    a : float
+    a : float, ndarray
         The a axis length.
-    b : float
+    b : float, ndarray
         The b axis length.
-    c : float
+    c : float, ndarray
         The c axis length.
-    eps : float complex
+    eps : float complex, ndarray
         The complex refractive index of the ellipsoid.
+    table : dict, optional
+        A shape factor table from `shape_factor_table` to interpolate the shape factors from instead of evaluating the elliptic integrals.
     
     Returns
     -------
@@ -27,13 +33,221 @@ def ellipsoid(a, b, c, eps):
         The polarizability along the c axis of the ellipsoid.
     '''
     # calculate shape factors
-    lc = a*b*c/3.*elliprd(a**2., b**2., c**2.)
-    lb = a*b*c/3.*elliprd(a**2., c**2., b**2.)
-    la = 1.-lb-lc
+    la, lb, lc = shape_factors(a, b, c, table=table)
     
     # get polarizabilities
     alpha_a = 4.*np.pi*a*b*c*(eps-1.)/(3.+3.*la*(eps-1.))
     alpha_b = 4.*np.pi*a*b*c*(eps-1.)/(3.+3.*lb*(eps-1.))
     alpha_c = 4.*np.pi*a*b*c*(eps-1.)/(3.+3.*lc*(eps-1.))
     
-    return alpha_a, alpha_b, alpha_c
\ No newline at end of file
+    return alpha_a, alpha_b, alpha_c
+
+def ellipsoid_jac(a, b, c, eps):
+    '''
+    Get the polarizabilities for an ellipsoid and their derivatives with respect to the axis lengths and permittivity.
+    
+    Parameters
+    ----------
+    a : float, ndarray
+        The a axis length.
+    b : float, ndarray
+        The b axis length.
+    c : float, ndarray
+        The c axis length.
+    eps : float complex, ndarray
+        The complex refractive index of the ellipsoid.
+    
+    Returns
+    -------
+    alpha : ndarray
+        The (3,...) polarizabilities along the a, b and c axes.
+    jac : ndarray
+        The (3,4,...) derivatives of the polarizabilities with respect to a, b, c and eps. The polarizabilities are analytic in eps, so the derivatives with respect to its real and imaginary parts are `jac[:,3]` and `1j*jac[:,3]`.
+    '''
+    a, b, c, eps = np.broadcast_arrays(a, b, c, eps)
+    lfac = np.array(_shape_factors(a, b, c))
+    lfac_jac = shape_factors_jac(a, b, c)
+    
+    # alpha = v*(eps-1)/den with v = 4*pi*a*b*c and den = 3+3*l*(eps-1)
+    vol = 4.*np.pi*a*b*c
+    vol_jac = np.array([vol/a, vol/b, vol/c])
+    den = 3.+3.*lfac*(eps-1.)
+    alpha = vol*(eps-1.)/den
+    
+    jac = np.empty((3,4)+a.shape, dtype=complex)
+    jac[:,:3] = (eps-1.)*(vol_jac[np.newaxis]/den[:,np.newaxis]-3.*vol*(eps-1.)*lfac_jac/den[:,np.newaxis]**2.)
+    jac[:,3] = 3.*vol/den**2.
+    return alpha, jac
+
+def shape_factors_jac(a, b, c, step=1.e-20):
+    '''
+    Get the derivatives of the shape factors with respect to the axis lengths.
+    
+    The derivatives of the elliptic integrals use complex steps in the axis lengths, which are exact to rounding error.
+    
+    Parameters
+    ----------
+    a : float, ndarray
+        The a axis length.
+    b : float, ndarray
+        The b axis length.
+    c : float, ndarray
+        The c axis length.
+    step : float
+        The relative complex step size.
+    
+    Returns
+    -------
+    lfac_jac : ndarray
+        The (3,3,...) derivatives of the a, b and c shape factors (first axis) with respect to a, b and c (second axis).
+    '''
+    a, b, c = np.broadcast_arrays(*(np.asarray(ax, dtype=float) for ax in (a, b, c)))
+    lfac_jac = np.empty((3,3)+a.shape)
+    axes = [a, b, c]
+    for i in range(3):
+        h = step*axes[i]
+        axes_h = [ax+1j*h if j==i else ax for j, ax in enumerate(axes)]
+        lfac_jac[:,i] = np.imag(_shape_factors(*axes_h))/h
+    return lfac_jac
+
+@instrumented
+def shape_factors(a, b, c, table=None):
+    '''
+    Get the shape (depolarization) factors for an ellipsoid.
+    
+    Scalar axis lengths are memoized, so repeated particles only evaluate the elliptic integrals once.
+    
+    Parameters
+    ----------
+    a : float, ndarray
+        The a axis length.
+    b : float, ndarray
+        The b axis length.
+    c : float, ndarray
+        The c axis length.
+    table : dict, optional
+        A shape factor table from `shape_factor_table` to interpolate the shape factors from.
+    
+    Returns
+    -------
+    la : float, ndarray
+        The shape factor along the a axis.
+    lb : float, ndarray
+        The shape factor along the b axis.
+    lc : float, ndarray
+        The shape factor along the c axis.
+    '''
+    if np.ndim(a)==0 and np.ndim(b)==0 and np.ndim(c)==0:
+        return _shape_factors_scalar(float(a), float(b), float(c))
+    if table is not None:
+        return interp_shape_factors(a, b, c, table)
+    return _shape_factors(a, b, c)
+
+def _shape_factors(a, b, c):
+    lc = a*b*c/3.*elliprd(a**2., b**2., c**2.)
+    lb = a*b*c/3.*elliprd(a**2., c**2., b**2.)
+    la = 1.-lb-lc
+    return la, lb, lc
+
+@lru_cache(maxsize=4096)
+def _shape_factors_scalar(a, b, c):
+    return _shape_factors(a, b, c)
+
+def shape_factor_table(ratio_max=20., nratio=257, fname=None):
+    '''
+    Get a table of the shape factors over the axis ratios a/c and b/c, which fully determine them.
+    
+    The table is regular in the logarithm of the axis ratios and is interpolated bilinearly. The interpolation error estimate is the largest error sampled at the cell centers and edge midpoints, where the bilinear error of a smooth function usually peaks. It is not a guaranteed bound, since the errors between the samples are not checked.
+    
+    Parameters
+    ----------
+    ratio_max : float
+        The largest axis ratio (and the inverse of the smallest) in the table.
+    nratio : int
+        The number of table points along each axis ratio.
+    fname : str, optional
+        A .npz file to load the table from, or to save it to if the file does not exist. A `ValueError` is raised if the file holds a table with a different `ratio_max` or `nratio`, rather than overwriting it.
+    
+    Returns
+    -------
+    table : dict
+        The table with the log axis ratio grid `'lnr'`, the (nratio,nratio) shape factors `'lb'` and `'lc'` and the sampled error estimate `'err'`.
+    '''
+    if fname is not None and os.path.exists(fname):
+        with np.load(fname) as data:
+            table = {key:data[key] for key in data.files}
+        if not np.isclose(table['lnr'][-1], np.log(ratio_max), rtol=1.e-12, atol=0.) or len(table['lnr'])!=nratio:
+            raise ValueError(f'{fname} holds a table with ratio_max={np.exp(table["lnr"][-1]):g} and nratio={len(table["lnr"])}, '
+                             f'expected ratio_max={ratio_max:g} and nratio={nratio}')
+        return table
+    
+    lnr = np.linspace(-np.log(ratio_max), np.log(ratio_max), nratio)
+    rac, rbc = np.meshgrid(np.exp(lnr), np.exp(lnr), indexing='ij')
+    la, lb, lc = _shape_factors(rac, rbc, 1.)
+    table = {'lnr':lnr, 'lb':lb, 'lc':lc, 'err':0.}
+    
+    # check the interpolation at cell centers and edge midpoints
+    lnr_mid = 0.5*(lnr[1:]+lnr[:-1])
+    err = 0.
+    for lnr_a, lnr_b in [(lnr_mid,lnr_mid), (lnr_mid,lnr), (lnr,lnr_mid)]:
+        rac, rbc = np.meshgrid(np.exp(lnr_a), np.exp(lnr_b), indexing='ij')
+        la_ex, lb_ex, lc_ex = _shape_factors(rac, rbc, 1.)
+        la_in, lb_in, lc_in = interp_shape_factors(rac, rbc, 1., table)
+        err = max(err, np.max(np.abs(la_in-la_ex)), np.max(np.abs(lb_in-lb_ex)), np.max(np.abs(lc_in-lc_ex)))
+    table['err'] = err
+    
+    if fname is not None:
+        np.savez(fname, **table)
+    return table
+
+@instrumented
+def interp_shape_factors(a, b, c, table):
+    '''
+    Interpolate the shape factors for an ellipsoid from a table (see `shape_factor_table`). Axis ratios outside the table are evaluated exactly.
+    
+    Parameters
+    ----------
+    a : float, ndarray
+        The a axis length.
+    b : float, ndarray
+        The b axis length.
+    c : float, ndarray
+        The c axis length.
+    table : dict
+        The shape factor table.
+    
+    Returns
+    -------
+    la : ndarray
+        The shape factor along the a axis.
+    lb : ndarray
+        The shape factor along the b axis.
+    lc : ndarray
+        The shape factor along the c axis.
+    '''
+    a, b, c = np.broadcast_arrays(a, b, c)
+    lnr = table['lnr']
+    dlnr = lnr[1]-lnr[0]
+    
+    # fractional table indices
+    xa = (np.log(a/c)-lnr[0])/dlnr
+    xb = (np.log(b/c)-lnr[0])/dlnr
+    ia = np.clip(np.floor(xa).astype(int), 0, len(lnr)-2)
+    ib = np.clip(np.floor(xb).astype(int), 0, len(lnr)-2)
+    wa = xa-ia
+    wb = xb-ib
+    
+    lb = _bilinear(table['lb'], ia, ib, wa, wb)
+    lc = _bilinear(table['lc'], ia, ib, wa, wb)
+    
+    # exact shape factors outside the table
+    outside = (xa<0.)|(xa>len(lnr)-1)|(xb<0.)|(xb>len(lnr)-1)
+    if np.any(outside):
+        lb[outside], lc[outside] = _shape_factors(a[outside], b[outside], c[outside])[1:]
+    la = 1.-lb-lc
+    
+    return la, lb, lc
+
+def _bilinear(values, ia, ib, wa, wb):
+    return ((1.-wa)*(1.-wb)*values[ia,ib]+wa*(1.-wb)*values[ia+1,ib]+
+            (1.-wa)*wb*values[ia,ib+1]+wa*wb*values[ia+1,ib+1])
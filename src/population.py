@@ -0,0 +1,107 @@
+import numpy as np
+from .polarizability import ellipsoid
+from .transform import pc_rotate
+from .fields import ampl_scat_mat, cov_mat
+
+class Population:
+    '''
+    A particle population stored as contiguous arrays, one entry per particle.
+    
+    Parameters
+    ----------
+    a : ndarray (P,)
+        The a axis lengths.
+    b : ndarray (P,)
+        The b axis lengths.
+    c : ndarray (P,)
+        The c axis lengths.
+    eps : ndarray (P,)
+        The complex relative permittivities.
+    alpha : ndarray (P,)
+        The first Euler angles (zyz convention, radians).
+    beta : ndarray (P,)
+        The second Euler angles.
+    gamma : ndarray (P,)
+        The third Euler angles.
+    weight : ndarray (P,)
+        The number weights (e.g., number concentrations) of the particles.
+    '''
+    def __init__(self, a, b, c, eps, alpha=0., beta=0., gamma=0., weight=1.):
+        arrays = np.broadcast_arrays(*np.atleast_1d(a, b, c, eps, alpha, beta, gamma, weight))
+        dtypes = (float, float, float, complex, float, float, float, float)
+        (self.a, self.b, self.c, self.eps, self.alpha, self.beta, self.gamma,
+         self.weight) = (np.ascontiguousarray(arr, dtype=dt) for arr, dt in zip(arrays, dtypes))
+    
+    def __len__(self):
+        return len(self.a)
+    
+    def __getitem__(self, index):
+        return Population(self.a[index], self.b[index], self.c[index], self.eps[index],
+                          self.alpha[index], self.beta[index], self.gamma[index], self.weight[index])
+    
+    def tensors(self, table=None, dtype=complex):
+        '''
+        Get the (3,3,P) rotated polarizability tensors of the particles (see `polarizability.ellipsoid` and `transform.pc_rotate`).
+        '''
+        alp_a, alp_b, alp_c = ellipsoid(self.a, self.b, self.c, self.eps, table=table)
+        return pc_rotate(alp_a, alp_b, alp_c, self.alpha, self.beta, self.gamma, dtype=dtype)
+
+def scat_population(pop, phi_inc, theta_inc, phi_sca, theta_sca, k, reduce=None, block=65536, grid=False,
+                    table=None, dtype=complex, out=None):
+    '''
+    Get the amplitude scattering matrices of a particle population, running the polarizability, rotation and scattering calculations for blocks of particles at once.
+    
+    Parameters
+    ----------
+    pop : Population
+        The particle population.
+    phi_inc : ndarray (N,)
+        The incident phi angles in radians.
+    theta_inc : ndarray (N,)
+        The incident theta angles in radians.
+    phi_sca : ndarray (M,)
+        The scattered phi angles in radians.
+    theta_sca : ndarray (M,)
+        The scattered theta angles in radians.
+    k : float
+        The wave number for the incident wave.
+    reduce : str, optional
+        `None` for the per-particle amplitude matrices, `'amplitude'` for their weighted sum or `'cov'` for the weighted sum of the covariance products (see `fields.cov_mat`).
+    block : int
+        The number of particles in each block.
+    grid : bool
+        Whether `phi_sca` and `theta_sca` are grid axes (see `fields.ampl_scat_mat`).
+    table : dict, optional
+        A shape factor table (see `polarizability.shape_factor_table`).
+    dtype : data-type
+        The complex floating point type of the calculation.
+    out : ndarray, optional
+        A preallocated (2,2,P,N,M) array for the per-particle amplitude matrices.
+    
+    Returns
+    -------
+    smat : ndarray
+        The (2,2,P,N,M) amplitude matrices, the (2,2,N,M) weighted sum or the (2,2,2,2,N,M) weighted covariance sum.
+    '''
+    npart = len(pop)
+    nsca = np.size(phi_sca)*np.size(theta_sca) if grid else np.size(phi_sca)
+    if reduce is None and out is None:
+        out = np.empty((2,2,npart,np.size(phi_inc),nsca), dtype=dtype)
+    
+    total = 0.
+    for p0 in range(0, npart, block):
+        sub = pop[p0:p0+block]
+        smat = ampl_scat_mat(phi_inc, theta_inc, phi_sca, theta_sca, sub.tensors(table=table, dtype=dtype), k,
+                             grid=grid, dtype=dtype)
+        if reduce is None:
+            out[:,:,p0:p0+block] = smat
+        elif reduce=='amplitude':
+            total = total+np.tensordot(smat, sub.weight.astype(smat.real.dtype), axes=([2],[0]))
+        elif reduce=='cov':
+            total = total+np.tensordot(cov_mat(smat), sub.weight.astype(smat.real.dtype), axes=([4],[0]))
+        else:
+            raise ValueError(f'unknown reduction {reduce}')
+    
+    if reduce is None:
+        return out
+    return total
@@ -0,0 +1,65 @@
+import numpy as np
+from .vectors import spherical_basis
+from .transform import tensor_scat
+
+def radar_obs(alp_tens, k, phi=0., theta=np.pi/2., weights=None, kw2=0.93):
+    '''
+    Get polarimetric radar observables from polarizability tensors, using only the backscattering and forward scattering amplitude matrices.
+    
+    Parameters
+    ----------
+    alp_tens : ndarray
+       A (3,3,L) complex array of polarizability tensors (e.g., one for each orientation or particle).
+    k : float
+       The wave number for the incident wave.
+    phi : float
+       The phi angle of the radar beam propagation direction in radians.
+    theta : float
+       The theta angle of the radar beam propagation direction in radians.
+    weights : ndarray, optional
+       The (L,) number concentrations for each tensor in the inverse length units of `k` cubed. The default is an average over the tensors for a concentration of one.
+    kw2 : float
+       The dielectric factor |K_w|^2 for the reflectivity.
+    
+    Returns
+    -------
+    obs : dict
+      The horizontal reflectivity `'zh'` (length units of `k` to the sixth over length units cubed), differential reflectivity `'zdr'` (dB), linear depolarization ratio `'ldr'` (dB), specific differential phase `'kdp'` (degrees per length unit) and copolar correlation coefficient `'rhohv'`.
+    '''
+    if alp_tens.ndim==2:
+        alp_tens = alp_tens[:,:,np.newaxis]
+    nori = alp_tens.shape[2]
+    if weights is None:
+        weights = np.full(nori, 1./nori)
+    
+    # orientation-weighted moments of the backscattering and forward scattering amplitudes
+    smat_back, smat_fwd = _back_fwd(alp_tens, phi, theta, k)
+    return _observables(_moments(smat_back, smat_fwd, k)@weights, k, kw2)
+
+def _back_fwd(alp_tens, phi, theta, k=1.):
+    # (2,2,L) backscattering and forward scattering amplitude matrices
+    bas_inc = spherical_basis(phi, theta)
+    bas_back = spherical_basis(phi+np.pi, np.pi-theta)
+    pref = 1j*k**3./(4.*np.pi)
+    smat_back = pref*tensor_scat(alp_tens, bas_inc, bas_back)[:,:,:,0,0]
+    smat_fwd = pref*tensor_scat(alp_tens, bas_inc, bas_inc, fscat=True)[:,:,:,0]
+    return smat_back, smat_fwd
+
+def _moments(smat_back, smat_fwd, k):
+    # (5,L) second moments of the backscattering amplitudes and forward scattering amplitudes in length units
+    return np.stack([np.abs(smat_back[1,1])**2., np.abs(smat_back[0,0])**2., np.abs(smat_back[0,1])**2.,
+                     smat_back[1,1]*np.conj(smat_back[0,0]), (smat_fwd[1,1]-smat_fwd[0,0])/(1j*k)])
+
+def _observables(mom, k, kw2):
+    # observables from (5,...) weighted sums of the moments
+    shh2, svv2, svh2 = np.real(mom[:3])
+    shhvv, fdiff = mom[3], mom[4]
+    wavl = 2.*np.pi/k
+    
+    obs = {}
+    obs['zh'] = wavl**4./(np.pi**5.*kw2)*4.*np.pi*shh2/k**2.
+    obs['zdr'] = 10.*np.log10(shh2/svv2)
+    obs['ldr'] = 10.*np.log10(svh2/shh2)
+    obs['kdp'] = 180./np.pi*wavl*np.real(fdiff)
+    obs['rhohv'] = np.abs(shhvv)/np.sqrt(shh2*svv2)
+    return obs
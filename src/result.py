@@ -0,0 +1,147 @@
+import numpy as np
+from .vectors import spherical_basis, grid_basis
+from .fields import cov_mat, mueller_mat
+
+class ScatteringResult:
+    '''
+    Amplitude scattering matrices that are computed element by element on access.
+    
+    Indexing with `result[i,j,...]` returns the (L,N,M) array of the `S_ij` element (optionally sliced over orientations, incident and scattered directions) and computes only that element for the selection. Computed selections are cached.
+    
+    Parameters
+    ----------
+    alp_tens : ndarray
+       A (3,3,L) complex array representing the polarizability tensor.
+    bas_inc : ndarray
+       The (3,3,N) incident basis vectors.
+    bas_sca : ndarray
+       The (3,3,M) scattered basis vectors, or (3,3,N,M) for the Bohren and Huffman (1983) convention.
+    k : float
+       The wave number for the incident wave.
+    '''
+    def __init__(self, alp_tens, bas_inc, bas_sca, k):
+        if alp_tens.ndim==2:
+            alp_tens = alp_tens[:,:,np.newaxis]
+        self.alp_tens = alp_tens
+        self.vh_inc = bas_inc[:,:2]
+        self.vh_sca = bas_sca[:,:2]
+        self.k = k
+        self.bh = bas_sca.ndim==4
+        self.shape = (2,2,alp_tens.shape[2],bas_inc.shape[2],bas_sca.shape[-1])
+        self._cache = {}
+    
+    def __getitem__(self, index):
+        if not isinstance(index, tuple) or len(index)<2:
+            raise IndexError('index the element with result[i,j,...]')
+        i, j = index[:2]
+        return self.element(i, j, *index[2:])
+    
+    def element(self, i, j, orient=slice(None), inc=slice(None), sca=slice(None)):
+        '''
+        Get one element of the amplitude scattering matrices.
+        
+        Parameters
+        ----------
+        i : int
+            The scattered polarization index (0 for `e_v`, 1 for `e_h`).
+        j : int
+            The incident polarization index.
+        orient : int, slice, ndarray
+            The orientations to compute.
+        inc : int, slice, ndarray
+            The incident directions to compute.
+        sca : int, slice, ndarray
+            The scattered directions to compute.
+        
+        Returns
+        -------
+        smat_ij : ndarray
+            The (l,n,m) array of `S_ij` for the selection.
+        '''
+        sel = (orient, inc, sca)
+        key = (i, j)+tuple(_sel_key(s) for s in sel)
+        if key in self._cache:
+            return self._cache[key]
+        
+        # integer selections keep their axis until the end
+        scalar = tuple(axis for axis, s in enumerate(sel) if not isinstance(s, slice) and np.ndim(s)==0)
+        orient, inc, sca = ([s] if axis in scalar else s for axis, s in enumerate(sel))
+        
+        # slice a fully computed element instead of recomputing
+        full_key = (i, j)+(_sel_key(slice(None)),)*3
+        if full_key in self._cache:
+            full = self._cache[full_key]
+            smat_ij = full[orient][:,inc][:,:,sca]
+        else:
+            smat_ij = self._compute(i, j, orient, inc, sca)
+        smat_ij = np.squeeze(smat_ij, axis=scalar)
+        self._cache[key] = smat_ij
+        return smat_ij
+    
+    def power(self, i, j, *sel):
+        '''
+        Get |S_ij|^2 for a selection (see `element`).
+        '''
+        return np.abs(self.element(i, j, *sel))**2.
+    
+    def amplitude(self, *sel):
+        '''
+        Get all four elements as a (2,2,l,n,m) array for a selection (see `element`).
+        '''
+        return np.array([[self.element(i, j, *sel) for j in range(2)] for i in range(2)])
+    
+    def mueller(self, *sel):
+        '''
+        Get the (4,4,l,n,m) Mueller matrices for a selection (see `element` and `fields.mueller_mat`).
+        '''
+        return mueller_mat(cov_mat(self.amplitude(*sel)))
+    
+    def _compute(self, i, j, orient, inc, sca):
+        tens = self.alp_tens[:,:,orient]
+        vinc = self.vh_inc[:,j,inc]
+        
+        # tensors applied to the incident polarization (l,n,3)
+        tens_inc = np.einsum('abl,bn->lna', tens, vinc)
+        if self.bh:
+            vsca = self.vh_sca[:,i,inc][:,:,sca]
+            smat_ij = np.matmul(tens_inc.transpose(1,0,2), vsca.transpose(1,0,2)).transpose(1,0,2)
+        else:
+            vsca = self.vh_sca[:,i,sca]
+            smat_ij = np.matmul(tens_inc, vsca)
+        return 1j*self.k**3./(4.*np.pi)*smat_ij
+
+def _sel_key(sel):
+    # hashable key for a slice or index array
+    if isinstance(sel, slice):
+        return ('slice', sel.start, sel.stop, sel.step)
+    sel = np.asarray(sel)
+    return ('array', sel.dtype.str, sel.shape, sel.tobytes())
+
+def lazy_scat_mat(phi_inc, theta_inc, phi_sca, theta_sca, alp_tens, k, grid=False):
+    '''
+    Get lazily evaluated amplitude scattering matrices with the same arguments and element layout as `fields.ampl_scat_mat`.
+    
+    Returns
+    -------
+    result : ScatteringResult
+      The amplitude scattering matrices, computed on access.
+    '''
+    bas_inc = spherical_basis(phi_inc, theta_inc)
+    if grid:
+        bas_sca = grid_basis(phi_sca, theta_sca).reshape(3,3,-1)
+    else:
+        bas_sca = spherical_basis(phi_sca, theta_sca)
+    return ScatteringResult(alp_tens, bas_inc, bas_sca, k)
+
+def lazy_scat_mat_bh(phi_1d_sca, theta_1d_sca, alp_tens, k):
+    '''
+    Get lazily evaluated amplitude scattering matrices with the same arguments and element layout as `fields.ampl_scat_mat_bh`.
+    
+    Returns
+    -------
+    result : ScatteringResult
+      The amplitude scattering matrices, computed on access.
+    '''
+    bas_inc = grid_basis(phi_1d_sca, 0.)[:,:,:,0]
+    bas_sca = grid_basis(phi_1d_sca, theta_1d_sca)
+    return ScatteringResult(alp_tens, bas_inc, bas_sca, k)
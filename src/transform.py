@@ -1,17 +1,21 @@
 import numpy as np
-from scipy.spatial.transform import Rotation
+from functools import partial
+from .parallel import map_orient
+from .vectors import spherical_basis, grid_basis
+from .instrument import instrumented
 
-def pc_rotate(pa, pb, pc, alpha, beta, gamma):
+@instrumented
+def pc_rotate(pa, pb, pc, alpha, beta, gamma, dtype=complex, workers=1, chunk=None, executor='thread', dedup=False):
     '''
     Get the transformed tensor from the three principle components and the Euler rotation angles.
 
     Parameters
     ----------
-    pa : float complex
+    pa : float complex, ndarray
         The value of along principle axis a.
-    pb : float complex
+    pb : float complex, ndarray
         The value of along principle axis b.
-    pc : float complex
+    pc : float complex, ndarray
         The value of along principle axis c.
     alpha : float, ndarray
         The first Euler angle rotation (zyz convention, radians).
@@ -19,27 +23,241 @@ def pc_rotate(pa, pb, pc, alpha, beta, gamma):
         The second Euler angle rotation (zyz convention, radians).
     gamma : float, ndarray
         The third Euler angle rotation (zyz convention, radians).
+    dtype : data-type
+        The complex floating point type of the tensors (e.g., `np.complex64` for single precision).
+    workers : int
+        The number of threads or processes to split the particles across.
+    chunk : int, optional
+        The number of particles for each parallel task.
+    executor : str
+        `'thread'` or `'process'` (see `parallel.map_orient`).
+    dedup : bool
+        Whether to rotate only the distinct orientations (see `unique_orientations`) and expand the result.
     
     Returns
     -------
     tensor_tr : ndarray
-        The transformed tensor for the principle components.
-    '''
-    tensor = np.zeros([3,3], dtype=complex)
-    tensor[0,0] = pa
-    tensor[1,1] = pb
-    tensor[2,2] = pc
-    rot = Rotation.from_euler('ZYZ', np.array([alpha,beta,gamma]).T)
-    rmat = rot.as_matrix()
-    
-    # add dimension if rotation angles are scalar
-    if len(rmat.shape)==2:
-        rmat.shape = (1,3,3)
-        
-    tensor_tr = np.einsum('ij,ljk->lik', tensor, rmat)
-    tensor_tr = np.einsum('lij,lik->jkl', rmat, tensor_tr)
+        The (3,3,L) transformed tensors for the principle components, where the principal values and Euler angles are broadcast together to length `L` (e.g., one tensor per particle).
+    '''
+    if dedup:
+        pvals, inverse = unique_orientations(pa, pb, pc, alpha, beta, gamma)
+        tensor_tr = pc_rotate(*pvals, dtype=dtype, workers=workers, chunk=chunk, executor=executor)
+        return tensor_tr[:,:,inverse]
+    
+    rdtype = np.finfo(dtype).dtype
+    pa, pb, pc = (np.asarray(p, dtype=dtype) for p in (pa, pb, pc))
+    alpha, beta, gamma = (np.asarray(ang, dtype=rdtype) for ang in (alpha, beta, gamma))
+    pa, pb, pc, alpha, beta, gamma = np.broadcast_arrays(*np.atleast_1d(pa, pb, pc, alpha, beta, gamma))
+    if workers>1:
+        task_args = lambda lslice: ((pa[lslice], pb[lslice], pc[lslice], alpha[lslice], beta[lslice], gamma[lslice]),
+                                    {'dtype':dtype})
+        return map_orient(pc_rotate, task_args, len(alpha), (3,3,len(alpha)), dtype,
+                          workers=workers, chunk=chunk, executor=executor)
+    rmat = rotation_matrix(alpha, beta, gamma)
+    
+    # R^T diag(p) R as a weighted sum of outer products of the rows of R
+    tensor_tr = np.empty((3,3)+alpha.shape, dtype=dtype)
+    for j in range(3):
+        for k in range(j,3):
+            tensor_tr[j,k] = pa*(rmat[0,j]*rmat[0,k])+pb*(rmat[1,j]*rmat[1,k])+pc*(rmat[2,j]*rmat[2,k])
+            tensor_tr[k,j] = tensor_tr[j,k]
     return tensor_tr
 
+@instrumented
+def rotation_matrix(alpha, beta, gamma):
+    '''
+    Get the rotation matrices for intrinsic zyz Euler angles.
+
+    Parameters
+    ----------
+    alpha : float, ndarray
+        The first Euler angle rotation (radians).
+    beta : float, ndarray
+        The second Euler angle rotation (radians).
+    gamma : float, ndarray
+        The third Euler angle rotation (radians).
+    
+    Returns
+    -------
+    rmat : ndarray
+        The (3,3,...) rotation matrices Rz(alpha) Ry(beta) Rz(gamma).
+    '''
+    ca = np.cos(alpha)
+    sa = np.sin(alpha)
+    cb = np.cos(beta)
+    sb = np.sin(beta)
+    cg = np.cos(gamma)
+    sg = np.sin(gamma)
+    rmat = np.array([[ca*cb*cg-sa*sg, -ca*cb*sg-sa*cg, ca*sb],
+                     [sa*cb*cg+ca*sg, -sa*cb*sg+ca*cg, sa*sb],
+                     [-sb*cg, sb*sg, cb]])
+    return rmat
+
+def rotation_matrix_jac(alpha, beta, gamma):
+    '''
+    Get the derivatives of the rotation matrices for intrinsic zyz Euler angles (see `rotation_matrix`).
+    
+    Parameters
+    ----------
+    alpha : float, ndarray
+        The first Euler angle rotation (radians).
+    beta : float, ndarray
+        The second Euler angle rotation (radians).
+    gamma : float, ndarray
+        The third Euler angle rotation (radians).
+    
+    Returns
+    -------
+    rmat_jac : ndarray
+        The (3,3,3,...) derivatives of the rotation matrices with respect to alpha, beta and gamma (first axis).
+    '''
+    ca = np.cos(alpha)
+    sa = np.sin(alpha)
+    cb = np.cos(beta)
+    sb = np.sin(beta)
+    cg = np.cos(gamma)
+    sg = np.sin(gamma)
+    zero = np.zeros_like(ca*cb*cg)
+    rmat_jac = np.array([[[-sa*cb*cg-ca*sg, sa*cb*sg-ca*cg, -sa*sb+zero],
+                          [ca*cb*cg-sa*sg, -ca*cb*sg-sa*cg, ca*sb+zero],
+                          [zero, zero, zero]],
+                         [[-ca*sb*cg, ca*sb*sg, ca*cb+zero],
+                          [-sa*sb*cg, sa*sb*sg, sa*cb+zero],
+                          [-cb*cg, cb*sg, -sb+zero]],
+                         [[-ca*cb*sg-sa*cg, -ca*cb*cg+sa*sg, zero],
+                          [-sa*cb*sg+ca*cg, -sa*cb*cg-ca*sg, zero],
+                          [sb*sg, sb*cg, zero]]])
+    return rmat_jac
+
+def pc_rotate_jac(pa, pb, pc, alpha, beta, gamma, dtype=complex):
+    '''
+    Get the transformed tensors (see `pc_rotate`) and their derivatives with respect to the principal components and Euler angles.
+    
+    Parameters
+    ----------
+    pa : float complex, ndarray
+        The value of along principle axis a.
+    pb : float complex, ndarray
+        The value of along principle axis b.
+    pc : float complex, ndarray
+        The value of along principle axis c.
+    alpha : float, ndarray
+        The first Euler angle rotation (zyz convention, radians).
+    beta : float, ndarray
+        The second Euler angle rotation (zyz convention, radians).
+    gamma : float, ndarray
+        The third Euler angle rotation (zyz convention, radians).
+    dtype : data-type
+        The complex floating point type of the tensors.
+    
+    Returns
+    -------
+    tensor_tr : ndarray
+        The (3,3,L) transformed tensors.
+    jac : ndarray
+        The (6,3,3,L) derivatives of the tensors with respect to pa, pb, pc, alpha, beta and gamma.
+    '''
+    rdtype = np.finfo(dtype).dtype
+    pa, pb, pc = (np.asarray(p, dtype=dtype) for p in (pa, pb, pc))
+    alpha, beta, gamma = (np.asarray(ang, dtype=rdtype) for ang in (alpha, beta, gamma))
+    pa, pb, pc, alpha, beta, gamma = np.broadcast_arrays(*np.atleast_1d(pa, pb, pc, alpha, beta, gamma))
+    pvals = np.array([pa, pb, pc])
+    rmat = rotation_matrix(alpha, beta, gamma)
+    rmat_jac = rotation_matrix_jac(alpha, beta, gamma)
+    
+    # d(R^T diag(p) R) = outer products of the rows of R for the components and dR^T diag(p) R + transpose for the angles
+    jac = np.empty((6,3,3)+alpha.shape, dtype=dtype)
+    jac[:3] = np.einsum('ij...,ik...->ijk...', rmat, rmat)
+    half = np.einsum('i...,aij...,ik...->ajk...', pvals, rmat_jac, rmat)
+    jac[3:] = half+np.swapaxes(half, 1, 2)
+    tensor_tr = np.einsum('i...,ijk...->jk...', pvals, jac[:3])
+    return tensor_tr, jac
+
+def unique_orientations(pa, pb, pc, alpha, beta, gamma, decimals=10):
+    '''
+    Get the distinct principal values and orientations, removing the Euler angles that do not change the rotated tensor (see `pc_rotate`).
+    
+    The first Euler angle is dropped for spheroids with `pa == pb`, and the first and third angles are combined when `beta` is 0 or pi.
+    
+    Parameters
+    ----------
+    pa : float complex, ndarray
+        The value along principal axis a.
+    pb : float complex, ndarray
+        The value along principal axis b.
+    pc : float complex, ndarray
+        The value along principal axis c.
+    alpha : float, ndarray
+        The first Euler angle rotation (zyz convention, radians).
+    beta : float, ndarray
+        The second Euler angle rotation (zyz convention, radians).
+    gamma : float, ndarray
+        The third Euler angle rotation (zyz convention, radians).
+    decimals : int
+        The number of decimals of the angles (radians), of the principal values relative to the largest one of each particle and of the logarithm of that largest magnitude that distinguish orientations.
+    
+    Returns
+    -------
+    pvals : tuple
+        The `(pa, pb, pc, alpha, beta, gamma)` arrays of the `U` distinct particles.
+    inverse : ndarray
+        The (L,) indices of the distinct particles for each input particle.
+    '''
+    pa, pb, pc, alpha, beta, gamma = np.broadcast_arrays(*np.atleast_1d(pa, pb, pc, alpha, beta, gamma))
+    alpha = alpha.astype(float)
+    gamma = gamma.astype(float)
+    
+    # beta of 0 or pi leaves a single rotation about z
+    beta = np.mod(beta, 2.*np.pi)
+    flat = np.round(np.sin(beta), decimals)==0.
+    flip = flat&(np.cos(beta)<0.)
+    alpha = np.where(flat, alpha+np.where(flip, -gamma, gamma), alpha)
+    gamma = np.where(flat, 0., gamma)
+    
+    # the first rotation about z does not change spheroids with pa == pb
+    scale = np.maximum(np.abs(pa), np.abs(pb))
+    scale = np.where(scale>0., scale, 1.)
+    spheroid = np.round(np.abs(pa-pb)/scale, decimals)==0.
+    alpha = np.where(spheroid, 0., alpha)
+    
+    key = np.stack([np.round(np.mod(ang, 2.*np.pi), decimals) for ang in (alpha, beta, gamma)], axis=1)
+    key = np.where(key==np.round(2.*np.pi, decimals), 0., key)+0.
+    key = np.concatenate((key, _scaled_key(np.stack([pa, pb, pc], axis=1), decimals)), axis=1)
+    key, index, inverse = np.unique(key, axis=0, return_index=True, return_inverse=True)
+    pvals = (pa[index], pb[index], pc[index], alpha[index], beta[index], gamma[index])
+    return pvals, inverse.reshape(-1)
+
+def unique_tensors(tensor, decimals=10):
+    '''
+    Get the distinct tensors of a (3,3,L) stack, such as repeated orientations of a symmetric grid.
+    
+    Parameters
+    ----------
+    tensor : ndarray
+        The (3,3,L) tensors.
+    decimals : int
+        The number of decimals of the tensor elements, relative to the largest element of each tensor, and of the logarithm of that largest magnitude that distinguish tensors.
+    
+    Returns
+    -------
+    tensor_u : ndarray
+        The (3,3,U) distinct tensors.
+    inverse : ndarray
+        The (L,) indices of the distinct tensors for each input tensor.
+    '''
+    tensor = tensor.reshape(3,3,-1)
+    key = _scaled_key(tensor.reshape(9,-1).T, decimals)
+    key, index, inverse = np.unique(key, axis=0, return_index=True, return_inverse=True)
+    return tensor[:,:,index], inverse.reshape(-1)
+
+def _scaled_key(values, decimals):
+    # (L,2K+1) rounded keys of (L,K) values relative to the largest magnitude of each row, plus the rounded log magnitude
+    scale = np.max(np.abs(values), axis=1)
+    scale = np.where(scale>0., scale, 1.)
+    rel = values/scale[:,np.newaxis]
+    return np.round(np.concatenate((np.real(rel), np.imag(rel), np.log(scale)[:,np.newaxis]), axis=1), decimals)+0.
+
+@instrumented
 def tensor_scat(tensor, basis_inc, basis_sca, fscat=False, bh=False):
     '''
     Transform the polarizability tensor into the 2x2 far-field scattering basis given the incident and scattering polarization bases.
@@ -63,24 +281,160 @@ def tensor_scat(tensor, basis_inc, basis_sca, fscat=False, bh=False):
         The (2,2,L,N,M) tensor in the incident and scattered polarization bases. In the case where `fscat=True`, the output dimension of the tensor is (2,2,L,N).
     '''
     vh_inc = basis_inc[:,:2,:]
-    vh_sca = basis_sca[:,:2,:]
+    vh_sca = basis_sca[:,:2,...]
     
-    # expand tensor dimensions if there is only a single tensor
+    # expand tensor dimensions if there is only a single tensor (as a view, leaving the caller's array unchanged)
     if len(tensor.shape)==2:
-        tensor.shape = (3,3,1)
+        tensor = tensor[:,:,np.newaxis]
     
     if fscat:
-        tensor_sca = np.einsum('ijo,jkp->ikop', tensor, vh_inc)
-        tensor_sca = np.einsum('ilp,ikop->lkop', vh_sca, tensor_sca)
+        mode = 'fscat'
     elif bh:
-        tensor_sca = np.einsum('ijo,jkp->ikop', tensor, vh_inc)
-        tensor_sca = np.einsum('ilpq,ikop->lkopq', vh_sca, tensor_sca)
+        mode = 'bh'
     else:
-        tensor_sca = np.einsum('ijo,jkp->ikop', tensor, vh_inc)
-        tensor_sca = np.einsum('ilq,ikop->lkopq', vh_sca, tensor_sca)
+        mode = 'general'
+    nori = tensor.shape[2]
+    ninc = vh_inc.shape[2]
+    nsca = vh_sca.shape[-1]
+    order = contraction_plan(mode, nori, ninc, nsca)
+    tensor_sca = _CONTRACTIONS[(mode,order)](tensor, vh_inc, vh_sca)
     
     return tensor_sca
 
+# cached contraction orders keyed by (mode, L, N, M), least recently used first
+_plans = {}
+_PLANS_SIZE = 256
+
+def contraction_plan(mode, nori, ninc, nsca):
+    '''
+    Get the cheapest contraction order for transforming `nori` tensors into the scattering basis.
+
+    The costs are rough estimates (in ns) of the work outside of writing the (2,2,L,N,M) output, which all orders share. The `'inc'` order contracts the tensors with the incident basis first, the `'sca'` order contracts them with the scattered basis first and the `'outer'` order forms the outer product of the two bases and does a single batched matrix multiply over the flattened tensors. The chosen orders of the most recently used shape signatures are cached.
+    
+    Parameters
+    ----------
+    mode : str
+        The kind of contraction, one of `'general'`, `'fscat'` or `'bh'` (see `tensor_scat`).
+    nori : int
+        The number of tensors `L`.
+    ninc : int
+        The number of incident directions `N`.
+    nsca : int
+        The number of scattered directions `M` (ignored for `'fscat'`).
+    
+    Returns
+    -------
+    order : str
+        The contraction order, one of `'inc'`, `'sca'` or `'outer'`.
+    '''
+    key = (mode, nori, ninc, nsca)
+    order = _plans.pop(key, None)
+    if order is not None:
+        _plans[key] = order
+        return order
+    
+    if mode=='fscat':
+        costs = {'inc':108.*nori*ninc,
+                 'outer':400.*ninc}
+    elif mode=='bh':
+        costs = {'inc':108.*nori*ninc+2640.*ninc+8.*nori*ninc*nsca,
+                 'outer':400.*ninc*nsca}
+    else:
+        costs = {'inc':108.*nori*ninc,
+                 'sca':20.*nori*nsca+2640.*nori,
+                 'outer':400.*ninc*nsca}
+    order = min(costs, key=costs.get)
+    if len(_plans)>=_PLANS_SIZE:
+        _plans.pop(next(iter(_plans)), None)
+    _plans[key] = order
+    return order
+
+def _tensor_inc(tensor, vh_inc):
+    # (L,3,2,N) array of the tensors applied to the incident basis vectors with one matrix multiply
+    nori = tensor.shape[2]
+    ninc = vh_inc.shape[2]
+    tens_lij = np.ascontiguousarray(tensor.transpose(2,0,1)).reshape(3*nori,3)
+    return np.matmul(tens_lij, vh_inc.reshape(3,2*ninc)).reshape(nori,3,2,ninc)
+
+def _basis_outer(vh_inc, vh_sca, mode, dtype=float):
+    # (4,9,N*M) outer products of the scattered and incident basis vectors, written once in the tensor type
+    ninc = vh_inc.shape[2]
+    if mode=='bh':
+        nsca = vh_sca.shape[3]
+        sca = vh_sca.transpose(1,0,2,3)[:,None,:,None,:,:]
+        inc = vh_inc.transpose(1,0,2)[None,:,None,:,:,None]
+    elif mode=='fscat':
+        nsca = 1
+        sca = vh_sca.transpose(1,0,2)[:,None,:,None,:]
+        inc = vh_inc.transpose(1,0,2)[None,:,None,:,:]
+    else:
+        nsca = vh_sca.shape[2]
+        sca = vh_sca.transpose(1,0,2)[:,None,:,None,None,:]
+        inc = vh_inc.transpose(1,0,2)[None,:,None,:,:,None]
+    bouter = np.empty(np.broadcast_shapes(sca.shape, inc.shape), dtype=dtype)
+    if np.iscomplexobj(bouter):
+        # multiply into the real part so the ufunc does not allocate casting buffers
+        np.multiply(sca, inc, out=bouter.real)
+        bouter.imag = 0.
+    else:
+        np.multiply(sca, inc, out=bouter)
+    return bouter.reshape(4,9,ninc*nsca)
+
+def _contract_outer(tensor, vh_inc, vh_sca, mode='general'):
+    nori = tensor.shape[2]
+    bouter = _basis_outer(vh_inc, vh_sca, mode, tensor.dtype)
+    tensor_sca = np.matmul(tensor.reshape(9,nori).T, bouter)
+    if mode=='fscat':
+        return tensor_sca.reshape(2,2,nori,vh_inc.shape[2])
+    return tensor_sca.reshape(2,2,nori,vh_inc.shape[2],vh_sca.shape[-1])
+
+def _contract_inc(tensor, vh_inc, vh_sca):
+    nori = tensor.shape[2]
+    ninc = vh_inc.shape[2]
+    nsca = vh_sca.shape[2]
+    tens_inc = _tensor_inc(tensor, vh_inc)
+    
+    # 2x2 batched (L*N,3)x(3,M) products
+    tens_inc = tens_inc.transpose(2,0,3,1).reshape(2,nori*ninc,3)
+    tensor_sca = np.matmul(tens_inc[np.newaxis], vh_sca.transpose(1,0,2)[:,np.newaxis])
+    return tensor_sca.reshape(2,2,nori,ninc,nsca)
+
+def _contract_sca(tensor, vh_inc, vh_sca):
+    nori = tensor.shape[2]
+    nsca = vh_sca.shape[2]
+    tens_lji = np.ascontiguousarray(tensor.transpose(2,1,0)).reshape(3*nori,3)
+    tens_sca = np.matmul(tens_lji, vh_sca.reshape(3,2*nsca)).reshape(nori,3,2,nsca)
+    
+    # 2x2xL batched (N,3)x(3,M) products
+    tens_sca = tens_sca.transpose(2,0,1,3)
+    return np.matmul(vh_inc.transpose(1,2,0)[np.newaxis,:,np.newaxis], tens_sca[:,np.newaxis])
+
+def _contract_inc_bh(tensor, vh_inc, vh_sca):
+    tens_inc = _tensor_inc(tensor, vh_inc)
+    
+    # 2x2xN batched (L,3)x(3,M) products
+    tens_inc = tens_inc.transpose(2,3,0,1)
+    tensor_sca = np.matmul(tens_inc[np.newaxis], vh_sca.transpose(1,2,0,3)[:,np.newaxis])
+    return np.ascontiguousarray(tensor_sca.transpose(0,1,3,2,4))
+
+def _contract_inc_fscat(tensor, vh_inc, vh_sca):
+    nori = tensor.shape[2]
+    ninc = vh_inc.shape[2]
+    tens_inc = _tensor_inc(tensor, vh_inc)
+    
+    # N batched (2,3)x(3,2L) products
+    tens_inc = tens_inc.transpose(3,1,2,0).reshape(ninc,3,2*nori)
+    tensor_sca = np.matmul(vh_sca.transpose(2,1,0), tens_inc).reshape(ninc,2,2,nori)
+    return np.ascontiguousarray(tensor_sca.transpose(1,2,3,0))
+
+_CONTRACTIONS = {('general','inc'):_contract_inc,
+                 ('general','sca'):_contract_sca,
+                 ('general','outer'):_contract_outer,
+                 ('bh','inc'):_contract_inc_bh,
+                 ('bh','outer'):partial(_contract_outer, mode='bh'),
+                 ('fscat','inc'):_contract_inc_fscat,
+                 ('fscat','outer'):partial(_contract_outer, mode='fscat')}
+
 def bh_hv_basis(smat_bh, phi):
     '''
     Get the scattering amplitude matrices in the h-v basis from scattering amplitude matrices in the Bohren and Huffman (1983) basis.
@@ -103,27 +457,65 @@ def bh_hv_basis(smat_bh, phi):
     smat_hv = np.einsum('ijkl,jpl->ipkl', smat_bh, rmat)
     return smat_hv
 
-def scatdir_lab(smat_par, phi_sca, theta_sca):
+def beam_frame(phi_inc, theta_inc):
+    '''
+    Get the rotation matrices from the lab frame to the beam frame of incident directions, where the beam frame axes are the incident `e_v`, `e_h` and propagation directions. A lab-frame tensor `A` is `Q A Q^T` in the beam frame.
+    
+    Parameters
+    ----------
+    phi_inc : float, ndarray
+        The incident phi angles in radians.
+    theta_inc : float, ndarray
+        The incident theta angles in radians.
+        
+    Returns
+    -------
+    rot : ndarray
+        The (3,3,P) rotation matrices `Q`.
+    '''
+    return spherical_basis(phi_inc, theta_inc).transpose(1,0,2)
+
+def scatdir_lab(smat_bh, phi_1d_sca, theta_1d_sca, phi_inc, theta_inc, phi_sca, theta_sca):
     '''
-    Get the scattering amplitude matrices in lab-frame directions for scattering amplitude matrices in the particle frame (i.e., incident propagation direction along the z-axis).
+    Get the scattering amplitude matrices for lab-frame incident and scattered direction pairs from scattering amplitude matrices in the particle frame (i.e., incident propagation direction along the z-axis).
+    
+    The amplitude matrix is linear in the scattered basis vectors, `S_ij = e_sca_i . W e_inc_j`, where `W` is the polarizability tensor times the amplitude prefactor. The (3,2) products of `W` with the beam-frame x and y axes are recovered from the particle-frame grid by least squares, so any scattered direction is evaluated exactly, not only those on the grid. Each direction pair is rotated into its beam frame (see `beam_frame`), where the lab-frame incident `e_v` and `e_h` are the x and y axes. The particle orientations of `smat_bh` are those in the beam frame, so the same amplitude matrices serve all incident directions when the orientation distribution does not depend on the beam direction.
     
     Parameters
     ----------
-    smat_par : ndarray
-        The (2,2,N,M) array of scattering ampltiude matrices for `N` particle orientations and `M` scattering directions in the h-v convention for incident direction along the z axis.
+    smat_bh : ndarray
+        The (2,2,N,Nphi,Ntheta) array of scattering amplitude matrices for `N` particle orientations from `fields.ampl_scat_mat_bh`.
+    phi_1d_sca : ndarray
+        The 1D array of length `Nphi` of scattering plane phi angles of `smat_bh`.
+    theta_1d_sca : ndarray
+        The 1D array of length `Ntheta` of scattered theta angles of `smat_bh`.
+    phi_inc : ndarray
+        The 1D array of length `M` of lab-frame incident phi angles.
+    theta_inc : ndarray
+        The 1D array of length `M` of lab-frame incident theta angles.
     phi_sca : ndarray
-        The 1D array of length `M` of scattering phi angles relative to the z-axis propagation direction.
+        The 1D array of length `M` of lab-frame scattered phi angles.
     theta_sca : ndarray
-        The 1D array of length `M` of scattering theta angles relative to the z-axis propagation direction.
+        The 1D array of length `M` of lab-frame scattered theta angles.
         
     Returns
     -------
     smat_lab : ndarray
-        The (2,2,N,M) array of scattering amplitude matrices in the lab frame.
+        The (2,2,N,M) array of scattering amplitude matrices in the lab-frame h-v bases.
     '''
-    # 2x2 rotation matrix
-    rmat = np.array([[np.cos(phi),-np.sin(phi)],
-                     [np.sin(phi),np.cos(phi)]])
-    #smat_hv = np.einsum('ijk,jlpk->ilpk', rmat, smat_bh)
-    smat_hv = np.einsum('ijkl,jpl->ipkl', smat_bh, rmat)
-    return smat_hv
\ No newline at end of file
+    phi_inc, theta_inc, phi_sca, theta_sca = np.broadcast_arrays(*np.atleast_1d(phi_inc, theta_inc, phi_sca, theta_sca))
+    bas_inc = spherical_basis(phi_inc, theta_inc)
+    bas_sca = spherical_basis(phi_sca, theta_sca)
+    
+    # lab scattered basis vectors in the beam frame
+    sca_beam = np.einsum('acp,alp->clp', bas_inc, bas_sca)
+    
+    # least-squares fit of the (3,2,N) beam-frame W[:,:2] to the grid values, where the bohren and huffman incident
+    # bases lie in the xy plane
+    bh_sca = grid_basis(phi_1d_sca, theta_1d_sca)[:,:2]
+    bh_inc = grid_basis(phi_1d_sca, 0.)[:2,:2,:,0]
+    design = np.einsum('aijm,bnj->injmab', bh_sca, bh_inc).reshape(-1,6)
+    w_xy = np.einsum('kinjm,inljm->kl', np.linalg.pinv(design).reshape((6,)+smat_bh[:,:,0].shape), smat_bh)
+    
+    smat_lab = np.einsum('cip,cnl->inlp', sca_beam[:,:2], w_xy.reshape(3,2,-1))
+    return smat_lab
@@ -1,6 +1,8 @@
 import numpy as np
+from .instrument import instrumented
 
-def spherical_basis(phi, theta):
+@instrumented
+def spherical_basis(phi, theta, dtype=float):
     '''
     Get the basis vectors corresponding to spherical coordinates angles `phi` and `theta`. The basis vectors are `e_v`, `e_h`, and `e_r`, where `e_v x e_h = e_r`.
 
@@ -10,12 +12,16 @@ def spherical_basis(phi, theta):
         The azimuthal angle from the x axis.
     theta : float, ndarray
         The zenith angle from the z axis.
+    dtype : data-type
+        The real floating point type of the basis vectors (e.g., `np.float32` for single precision).
 
     Returns
     -------
     basis : ndarray
         The basis vectors return in columns of the (3,3) ndarray in the order of `e_v`, `e_h`, and `e_r`. 
     '''
+    phi = np.asarray(phi, dtype=dtype)
+    theta = np.asarray(theta, dtype=dtype)
     e_v = np.array([np.cos(theta)*np.cos(phi),
                     np.cos(theta)*np.sin(phi),
                     -np.sin(theta)])
@@ -36,3 +42,55 @@ def spherical_basis(phi, theta):
                             e_h[:,np.newaxis,:],
                             e_r[:,np.newaxis,:]), axis=1)
     return basis
+
+# cached grid bases keyed by the bytes of the phi and theta axes
+_grid_cache = {}
+_GRID_CACHE_SIZE = 8
+
+@instrumented
+def grid_basis(phi_1d, theta_1d, dtype=float):
+    '''
+    Get the basis vectors (see `spherical_basis`) on the grid of all pairs of the 1D `phi` and `theta` axes, evaluating the trigonometric functions only on the axes. The bases are cached for each grid and returned read-only.
+
+    Parameters
+    ----------
+    phi_1d : ndarray (N,)
+        The azimuthal angles from the x axis.
+    theta_1d : ndarray (M,)
+        The zenith angles from the z axis.
+    dtype : data-type
+        The real floating point type of the basis vectors.
+
+    Returns
+    -------
+    basis : ndarray
+        The (3,3,N,M) basis vectors with the columns in the order of `e_v`, `e_h`, and `e_r`.
+    '''
+    phi_1d = np.atleast_1d(np.asarray(phi_1d, dtype=dtype))
+    theta_1d = np.atleast_1d(np.asarray(theta_1d, dtype=dtype))
+    key = (phi_1d.dtype.str, phi_1d.tobytes(), theta_1d.tobytes())
+    basis = _grid_cache.get(key)
+    if basis is not None:
+        return basis
+    
+    cos_phi = np.cos(phi_1d)[:,np.newaxis]
+    sin_phi = np.sin(phi_1d)[:,np.newaxis]
+    cos_theta = np.cos(theta_1d)[np.newaxis,:]
+    sin_theta = np.sin(theta_1d)[np.newaxis,:]
+    
+    basis = np.empty((3,3,len(phi_1d),len(theta_1d)), dtype=phi_1d.dtype)
+    basis[0,0] = cos_theta*cos_phi
+    basis[1,0] = cos_theta*sin_phi
+    basis[2,0] = -sin_theta
+    basis[0,1] = -sin_phi
+    basis[1,1] = cos_phi
+    basis[2,1] = 0.
+    basis[0,2] = sin_theta*cos_phi
+    basis[1,2] = sin_theta*sin_phi
+    basis[2,2] = cos_theta
+    basis.flags.writeable = False
+    
+    if len(_grid_cache)>=_GRID_CACHE_SIZE:
+        _grid_cache.pop(next(iter(_grid_cache)))
+    _grid_cache[key] = basis
+    return basis
@@ -0,0 +1,55 @@
+import numpy as np
+from rayleighpy import transform
+from rayleighpy import polarizability
+from rayleighpy import fields
+from rayleighpy import cdm
+from rayleighpy.vectors import spherical_basis
+
+# test that a single monomer reduces to the rayleigh amplitudes
+def test_cdm_single():
+    phi = np.linspace(0., 360., 7)*np.pi/180.
+    theta = np.linspace(0., 180., 7)*np.pi/180.
+    k = 2.*np.pi/32.1
+    smat = cdm.cdm_scat_mat(np.zeros(3), 0.5, 0.3, 0.2, 3.17+0.1j, 0.3, 0.6, 0.9, 0.2, 0.4, phi, theta, k)
+    alp_tens = transform.pc_rotate(*polarizability.ellipsoid(0.5, 0.3, 0.2, 3.17+0.1j), 0.3, 0.6, 0.9)
+    smat_ref = fields.ampl_scat_mat(0.2, 0.4, phi, theta, alp_tens, k)
+    assert np.allclose(smat, smat_ref, rtol=1.e-12)
+
+# test the lattice fft interactions against the dense interactions for an aggregate
+def test_cdm_fft():
+    rng = np.random.default_rng(6)
+    sites = np.unique(rng.integers(0, 6, (60,3)), axis=0)
+    npos = len(sites)
+    spacing = 0.4
+    phi = np.linspace(0., 360., 7)*np.pi/180.
+    theta = np.linspace(0., 180., 7)*np.pi/180.
+    k = 2.*np.pi/3.2
+    args = (sites*spacing, 0.15, 0.12, 0.08, 3.17+0.1j, *(rng.random((3,npos))*np.pi),
+            np.array([0., 1.]), np.array([0.3, 1.2]), phi, theta, k)
+    smat = cdm.cdm_scat_mat(*args, tol=1.e-10)
+    smat_fft = cdm.cdm_scat_mat(*args, spacing=spacing, tol=1.e-10)
+    assert smat.shape==(2,2,1,2,7)
+    assert np.allclose(smat_fft, smat, rtol=1.e-7, atol=1.e-9*np.max(np.abs(smat)))
+
+    # the interactions change the result from the phased sum of independent monomers
+    alp_tens = transform.pc_rotate(*polarizability.ellipsoid(0.15, 0.12, 0.08, 3.17+0.1j), *args[5:8])
+    smat_ind = fields.ampl_scat_mat(0., 0.3, phi, theta, alp_tens, k)[:,:,:,0]
+    kdiff = spherical_basis(0., 0.3)[:,2]-spherical_basis(phi, theta)[:,2]
+    smat_ind = np.sum(smat_ind*np.exp(1j*k*args[0]@kdiff), axis=2)
+    assert np.max(np.abs(smat[:,:,0,0]-smat_ind))>0.01*np.max(np.abs(smat_ind))
+
+# test two touching spheres against the static coupled dipoles p = alpha/(1-alpha*G)
+def test_cdm_static_pair():
+    dist = 1.
+    k = 1.e-4
+    alp = polarizability.ellipsoid(0.5, 0.5, 0.5, 3.17)[0]
+    pos = np.array([[0., 0., -dist/2.], [0., 0., dist/2.]])
+    smat = cdm.cdm_scat_mat(pos, 0.5, 0.5, 0.5, 3.17, 0., 0., 0., 0., np.pi/2., np.array([0.]), np.array([np.pi/2.]), k)
+
+    # incident along x with e_v along -z (pair axis) and e_h along y (across the axis)
+    gpar = 2./(4.*np.pi*dist**3.)
+    gperp = -1./(4.*np.pi*dist**3.)
+    pref = 1j*k**3./(4.*np.pi)
+    assert np.abs(smat[0,0,0,0,0]-pref*2.*alp/(1.-alp*gpar))<1.e-6*np.abs(smat[0,0,0,0,0])
+    assert np.abs(smat[1,1,0,0,0]-pref*2.*alp/(1.-alp*gperp))<1.e-6*np.abs(smat[1,1,0,0,0])
+    assert np.abs(smat[0,0,0,0,0])>np.abs(pref*2.*alp)
@@ -0,0 +1,40 @@
+import os
+import numpy as np
+from rayleighpy import transform
+from rayleighpy import polarizability
+from rayleighpy import fields
+from rayleighpy import cli
+
+# test the chunked command-line run against direct calls, including a resumed run
+def test_cli(tmp_path):
+    rng = np.random.default_rng(2)
+    npart = 7
+    table = np.column_stack([rng.uniform(0.2, 1., (3,npart)).T, rng.uniform(1.5, 3.5, npart), np.full(npart, 0.01),
+                             rng.choice([32.1, 8.6], npart), rng.random((npart,3))*np.pi])
+    fname_csv = str(tmp_path/'particles.csv')
+    np.savetxt(fname_csv, table, delimiter=',', header=','.join(cli.COLUMNS), comments='')
+    fname_out = str(tmp_path/'smat.npy')
+    cli.main([fname_csv, fname_out, '--phi-sca', '0,90,180', '--theta-sca', '90,45,90', '--chunk', '3', '--quiet'])
+
+    phi_sca = np.array([0., 90., 180.])*np.pi/180.
+    theta_sca = np.array([90., 45., 90.])*np.pi/180.
+    smat = np.load(fname_out)
+    for ip in range(npart):
+        alp = polarizability.ellipsoid(*table[ip,:3], table[ip,3]+0.01j)
+        alp_tens = transform.pc_rotate(*alp, *table[ip,6:])
+        smat_p = fields.ampl_scat_mat(0., np.pi/2., phi_sca, theta_sca, alp_tens, 2.*np.pi/table[ip,5])
+        assert np.allclose(smat[:,:,ip], smat_p[:,:,0], rtol=1.e-12, atol=0.)
+    assert not os.path.exists(fname_out+'.done')
+
+    # resume a run interrupted after the first chunk from a structured .npy table
+    fname_npy = str(tmp_path/'particles.npy')
+    np.save(fname_npy, np.rec.fromarrays(table.T, names=list(cli.COLUMNS)))
+    smat_part = np.lib.format.open_memmap(fname_out, mode='r+')
+    smat_part[:,:,3:] = 0.
+    smat_part.flush()
+    del smat_part
+    with open(fname_out+'.done', 'w') as f:
+        f.write('3')
+    cli.run(fname_npy, fname_out, np.array([0.]), np.array([np.pi/2.]), phi_sca, theta_sca, chunk=3, resume=True,
+            progress=None)
+    assert np.allclose(np.load(fname_out), smat, rtol=1.e-12, atol=0.)
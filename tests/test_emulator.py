@@ -0,0 +1,44 @@
+import numpy as np
+from rayleighpy import transform
+from rayleighpy import polarizability
+from rayleighpy import fields
+from rayleighpy import emulator
+
+# test interpolated amplitudes and error estimates against the exact pipeline
+def test_emulator():
+    emu = emulator.build_emulator(ratio_range=(0.2,5.), eps_re_range=(1.5,3.5), eps_im_range=(0.,0.2),
+                                  shape=(17,17,5,5,17))
+    rng = np.random.default_rng(7)
+    npart = 200
+    c = rng.uniform(0.1, 1., npart)
+    a = c*np.exp(rng.uniform(np.log(0.2), np.log(5.), npart))
+    b = c*np.exp(rng.uniform(np.log(0.2), np.log(5.), npart))
+    eps = rng.uniform(1.5, 3.5, npart)+1j*rng.uniform(0., 0.2, npart)
+    beta = rng.uniform(0., np.pi/2., npart)
+    k = 2.*np.pi/32.1
+
+    smat_back, smat_fwd, err_back, err_fwd = emulator.query_emulator(emu, a, b, c, eps, beta, k)
+
+    alp_a, alp_b, alp_c = polarizability.ellipsoid(a, b, c, eps)
+    alp_tens = transform.pc_rotate(alp_a, alp_b, alp_c, 0., beta, 0.)
+    smat = fields.ampl_scat_mat(0., np.pi/2., np.pi, np.pi/2., alp_tens, k)[:,:,:,0,0]
+    smat_f = fields.ampl_fscat_mat(0., np.pi/2., alp_tens, k)[:,:,:,0]
+    scale = np.max(np.abs(smat), axis=(0,1))
+    assert np.max(np.abs(smat_back-smat)/scale)<0.02
+    assert np.max(np.abs(smat_fwd-smat_f)/scale)<0.02
+    assert np.mean(np.abs(smat_back-smat)<=3.*err_back+1.e-6*scale)>0.9
+
+# test that particles outside the tabulated ranges fall back to the exact calculation
+def test_emulator_outside():
+    emu = emulator.build_emulator(shape=(5,5,3,3,5))
+    k = 2.*np.pi/32.1
+    a = np.array([1., 1., 1.])
+    c = np.array([0.5, 20., 0.5])
+    eps = np.array([3.17+0.1j, 3.17+0.1j, 8.+0.5j])
+    smat_back, smat_fwd, err_back, err_fwd = emulator.query_emulator(emu, a, a, c, eps, 0.3, k)
+
+    alp_tens = transform.pc_rotate(*polarizability.ellipsoid(a, a, c, eps), 0., 0.3, 0.)
+    smat = fields.ampl_scat_mat(0., np.pi/2., np.pi, np.pi/2., alp_tens, k)[:,:,:,0,0]
+    assert np.all(err_back[:,:,1:]==0.)
+    assert np.allclose(smat_back[:,:,1:], smat[:,:,1:], rtol=1.e-12, atol=0.)
+    assert np.all(err_back[:,:,0]>0.)
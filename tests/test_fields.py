@@ -0,0 +1,131 @@
+import numpy as np
+import tracemalloc
+from rayleighpy import transform
+from rayleighpy import polarizability
+from rayleighpy import fields
+
+# test that streamed blocks written to a memmap match the dense calculation
+def test_ampl_scat_mat_blocks(tmp_path):
+    phi = np.linspace(0., 360., 13)*np.pi/180.
+    theta = np.linspace(0., 180., 7)*np.pi/180.
+    beta = np.linspace(0., 90., 5)*np.pi/180.
+    alp_a, alp_b, alp_c = polarizability.ellipsoid(2.,0.9,0.1, 3.17)
+    alp_tens = transform.pc_rotate(alp_a, alp_b, alp_c, 0.*beta, beta, 0.*beta)
+    k = 2.*np.pi/32.1
+
+    smat = fields.ampl_scat_mat_bh(phi, theta, alp_tens, k)
+    out = np.lib.format.open_memmap(tmp_path/'smat.npy', mode='w+', dtype=complex, shape=smat.shape)
+    fields.ampl_scat_mat_bh(phi, theta, alp_tens, k, out=out, max_bytes=2000)
+    assert np.max(np.abs(out-smat))<1.e-15
+
+    smat = fields.ampl_scat_mat(theta, theta, phi, 0.*phi+0.3, alp_tens, k)
+    smat_blk = fields.ampl_scat_mat(theta, theta, phi, 0.*phi+0.3, alp_tens, k, max_bytes=2000)
+    assert np.max(np.abs(smat_blk-smat))<1.e-15
+
+# test that each streamed block stays within the memory budget (after the first block, which also builds the bases)
+def test_ampl_scat_mat_blocks_memory():
+    phi = np.linspace(0., 360., 73)*np.pi/180.
+    theta = np.linspace(0., 180., 37)*np.pi/180.
+    beta = np.linspace(0., 90., 300)*np.pi/180.
+    alp_a, alp_b, alp_c = polarizability.ellipsoid(2.,0.9,0.1, 3.17)
+    alp_tens = transform.pc_rotate(alp_a, alp_b, alp_c, 0.*beta, beta, 0.*beta)
+    k = 2.*np.pi/32.1
+    max_bytes = 2**18
+
+    for blocks in (fields.iter_ampl_scat_mat_bh(phi, theta, alp_tens, k, max_bytes=max_bytes),
+                   fields.iter_ampl_scat_mat(phi, 0.*phi+0.5, phi[:10], theta[:10], alp_tens, k, max_bytes=max_bytes),
+                   fields.iter_ampl_scat_mat(0.2, 0.4, phi, theta, alp_tens, k, grid=True, max_bytes=max_bytes)):
+        smat = next(blocks)
+        del smat
+        tracemalloc.start()
+        for smat in blocks:
+            del smat
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        assert peak<=max_bytes
+
+# test the Mueller matrix elements against their explicit forms
+def test_mueller_mat():
+    rng = np.random.default_rng(2)
+    smat = rng.standard_normal((2,2,3))+1j*rng.standard_normal((2,2,3))
+    zmat = fields.mueller_mat(fields.cov_mat(smat))
+    s11, s12, s21, s22 = smat[0,0], smat[0,1], smat[1,0], smat[1,1]
+    assert np.allclose(zmat[0,0], 0.5*np.sum(np.abs(smat)**2., axis=(0,1)))
+    assert np.allclose(zmat[2,3], np.imag(s11*np.conj(s22)+s21*np.conj(s12)))
+    assert np.allclose(zmat[3,3], np.real(s22*np.conj(s11)-s12*np.conj(s21)))
+
+# test scattered directions given as grid axes
+def test_ampl_scat_mat_grid():
+    phi = np.linspace(0., 360., 13)*np.pi/180.
+    theta = np.linspace(0., 180., 7)*np.pi/180.
+    phif, thetaf = np.meshgrid(phi, theta, indexing='ij')
+    alp_a, alp_b, alp_c = polarizability.ellipsoid(2.,0.9,0.1, 3.17)
+    alp_tens = transform.pc_rotate(alp_a, alp_b, alp_c, 0.3, 0.2, 0.1)
+    k = 2.*np.pi/32.1
+
+    smat = fields.ampl_scat_mat(0.2, 0.4, phif.flatten(), thetaf.flatten(), alp_tens, k)
+    smat_grid = fields.ampl_scat_mat(0.2, 0.4, phi, theta, alp_tens, k, grid=True)
+    assert np.array_equal(smat_grid, smat)
+
+# single precision stays in complex64 with relative errors near float32 resolution (~1e-7, below 1e-5 here)
+def test_single_precision():
+    phi = np.linspace(0., 360., 73)*np.pi/180.
+    theta = np.linspace(0., 180., 37)*np.pi/180.
+    beta = np.linspace(0., 90., 10)*np.pi/180.
+    alp_a, alp_b, alp_c = polarizability.ellipsoid(2.,0.9,0.1, 3.17+0.1j)
+    k = 2.*np.pi/32.1
+
+    for dtype in (np.complex64, complex):
+        alp_tens = transform.pc_rotate(alp_a, alp_b, alp_c, beta, beta, 0.*beta, dtype=dtype)
+        smat_bh = fields.ampl_scat_mat_bh(phi, theta, alp_tens, k, dtype=dtype)
+        smat = fields.ampl_scat_mat(phi, 0.*phi+0.5, phi, theta, alp_tens, k, grid=True, dtype=dtype)
+        smat_f = fields.ampl_fscat_mat(phi, 0.*phi+0.5, alp_tens, k, dtype=dtype)
+        assert smat_bh.dtype==dtype and smat.dtype==dtype and smat_f.dtype==dtype
+        if dtype==np.complex64:
+            smats = (smat_bh, smat, smat_f)
+    for smat_sp, smat_dp in zip(smats, (smat_bh, smat, smat_f)):
+        assert np.max(np.abs(smat_sp-smat_dp))<1.e-5*np.max(np.abs(smat_dp))
+
+# test the amplitude matrix derivatives against central differences
+def test_ampl_scat_mat_jac():
+    params = [np.array([1.3, 0.9]), np.array([0.8, 0.9]), np.array([0.5, 0.3]), np.array([3.2+0.1j, 1.8+0.01j]),
+              np.array([0.3, 2.1]), np.array([0.7, 1.2]), np.array([1.9, 0.4])]
+    phi = np.linspace(0., 360., 7)*np.pi/180.
+    theta = np.linspace(0., 180., 5)*np.pi/180.
+    k = 2.*np.pi/32.1
+    smat, jac = fields.ampl_scat_mat_jac(0.2, 0.4, phi, theta, *params, k, grid=True)
+
+    smat_ref = fields.ampl_scat_mat(0.2, 0.4, phi, theta,
+                                    transform.pc_rotate(*polarizability.ellipsoid(*params[:4]), *params[4:]), k, grid=True)
+    assert np.allclose(smat, smat_ref, rtol=1.e-12, atol=0.)
+
+    h = 1.e-6
+    for i in range(7):
+        smat_fd = []
+        for sign in [1., -1.]:
+            params_h = [p+sign*h if j==i else p for j, p in enumerate(params)]
+            alp_tens = transform.pc_rotate(*polarizability.ellipsoid(*params_h[:4]), *params_h[4:])
+            smat_fd.append(fields.ampl_scat_mat(0.2, 0.4, phi, theta, alp_tens, k, grid=True))
+        assert np.allclose(jac[i], (smat_fd[0]-smat_fd[1])/(2.*h), rtol=1.e-6, atol=1.e-8*np.max(np.abs(smat)))
+
+# test repeated workspace calls against ampl_scat_mat without allocating or mutating the inputs
+def test_amplitude_workspace():
+    rng = np.random.default_rng(9)
+    k = 2.*np.pi/32.1
+    for nori, ninc, nsca in [(6,3,7), (300,1,2)]:
+        phi_inc, theta_inc, phi_sca, theta_sca = rng.random(ninc), rng.random(ninc), rng.random(nsca), rng.random(nsca)
+        work = fields.AmplitudeWorkspace(phi_inc, theta_inc, phi_sca, theta_sca, nori, k)
+        out = np.empty(work.shape, dtype=complex)
+        for i in range(3):
+            alp_tens = transform.pc_rotate(1.+0.1j, 2.+0.2j, 3.+0.3j, *rng.random((3,nori)))
+            alp_copy = alp_tens.copy()
+            assert work(alp_tens, out=out) is out
+            smat = fields.ampl_scat_mat(phi_inc, theta_inc, phi_sca, theta_sca, alp_tens, k)
+            assert np.allclose(out, smat, rtol=1.e-12, atol=0.)
+            assert np.array_equal(alp_tens, alp_copy)
+
+        tracemalloc.start()
+        work(alp_tens, out=out)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        assert peak<4096
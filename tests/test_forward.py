@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+from rayleighpy import transform
+from rayleighpy import polarizability
+from rayleighpy import radar
+from rayleighpy import forward
+
+# test the bulk operator for one cell against observables from weighted tensors
+def test_bulk_radar_cell():
+    k = 2.*np.pi/32.1
+    n0, mu, lam = 8.e-3, 1., 1.5
+    obs = forward.bulk_radar(n0, mu, lam, k, 0.1, 10., nquad=16, aspect=0.6, canting=0.)
+
+    x, wts = np.polynomial.legendre.leggauss(16)
+    diam = 4.95*x+5.05
+    frac = np.minimum(2.33e-4*diam**1.9/(np.pi/6.*0.6*diam**3.)/9.17e-4, 1.)
+    eps = forward.maxwell_garnett(3.17+0.009j, frac)
+    alp_a, alp_b, alp_c = polarizability.ellipsoid(diam/2., diam/2., 0.3*diam, eps)
+    alp_tens = transform.pc_rotate(alp_a, alp_b, alp_c, 0., 0., 0.)
+    obs_ref = radar.radar_obs(alp_tens, k, weights=4.95*wts*n0*diam**mu*np.exp(-lam*diam))
+    for key in ['zh', 'zdr', 'kdp', 'rhohv']:
+        assert np.allclose(obs[key], obs_ref[key], rtol=1.e-10)
+
+# test chunked evaluation over a 3-d grid
+def test_bulk_radar_grid():
+    rng = np.random.default_rng(3)
+    k = 2.*np.pi/32.1
+    shape = (3,4,5)
+    n0 = 10.**rng.uniform(-3., -1., shape)
+    lam = rng.uniform(0.5, 3., shape)
+    obs = forward.bulk_radar(n0, 0., lam, k, 0.1, 10., chunk=5, canting=10.*np.pi/180.)
+    obs_all = forward.bulk_radar(n0, 0., lam, k, 0.1, 10., chunk=12, canting=10.*np.pi/180.)
+    assert obs['zh'].shape==shape
+    assert np.all(obs['zdr']>0.)
+    assert np.all(obs['kdp']>0.)
+    for key in obs:
+        assert np.allclose(obs[key], obs_all[key], rtol=1.e-12)
+
+    # reflectivity scales with the intercept parameter
+    obs_2 = forward.bulk_radar(2.*n0, 0., lam, k, 0.1, 10., canting=10.*np.pi/180.)
+    assert np.allclose(obs_2['zh'], 2.*obs['zh'])
+    assert np.allclose(obs_2['zdr'], obs['zdr'])
+
+# test that canting is azimuthally symmetric, giving depolarization and lowering zdr
+def test_bin_moments_canting():
+    k = 2.*np.pi/32.1
+    diam = np.array([1., 3.])
+    obs = radar._observables(forward.bin_moments(diam, k), k, 0.93)
+    obs_cant = radar._observables(forward.bin_moments(diam, k, canting=0.3), k, 0.93)
+    obs_cant_y = radar._observables(forward.bin_moments(diam, k, canting=0.3, phi=np.pi/2.), k, 0.93)
+    assert np.all(np.isfinite(obs_cant['ldr']))
+    assert np.all(obs_cant['ldr']>-40.)
+    assert np.all(obs_cant['zdr']<obs['zdr'])
+    assert np.allclose(obs_cant['zdr'], obs_cant_y['zdr'], rtol=1.e-10)
+
+# test parameters that broadcast against each other and the checks on the output arrays
+def test_bulk_radar_broadcast():
+    rng = np.random.default_rng(5)
+    k = 2.*np.pi/32.1
+    n0 = 10.**rng.uniform(-3., -1., (3,4,5))
+    lam = rng.uniform(0.5, 3., 5)
+    obs = forward.bulk_radar(n0, 0., lam, k, 0.1, 10., chunk=5)
+    obs_full = forward.bulk_radar(n0, 0., np.broadcast_to(lam, n0.shape).copy(), k, 0.1, 10., chunk=5)
+    for key in obs:
+        assert np.allclose(obs[key], obs_full[key], rtol=1.e-12)
+
+    out = {key:np.empty((5,4,3)).transpose(2,1,0) for key in obs}
+    with pytest.raises(ValueError):
+        forward.bulk_radar(n0, 0., lam, k, 0.1, 10., out=out)
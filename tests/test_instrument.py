@@ -0,0 +1,32 @@
+import json
+import numpy as np
+from rayleighpy import transform
+from rayleighpy import polarizability
+from rayleighpy import fields
+from rayleighpy import instrument
+
+# test the recorded calls and the json and chrome trace exports
+def test_profile(tmp_path):
+    phi = np.linspace(0., 360., 13)*np.pi/180.
+    theta = np.linspace(0., 180., 13)*np.pi/180.
+    with instrument.Profile(memory=True) as prof:
+        alp_tens = transform.pc_rotate(*polarizability.ellipsoid(2., 0.9, 0.3, 3.17+0.1j), phi, theta, 0.)
+        smat = fields.ampl_scat_mat(0., 0., phi, theta, alp_tens, 2.*np.pi/32.1)
+    fields.ampl_scat_mat(0., 0., phi, theta, alp_tens, 2.*np.pi/32.1)
+
+    summary = prof.summary()
+    assert summary['fields.ampl_scat_mat']['calls']==1
+    assert summary['transform.tensor_scat']['calls']==1
+    assert summary['fields.ampl_scat_mat']['out_bytes']==smat.nbytes
+    assert summary['fields.ampl_scat_mat']['alloc']>=smat.nbytes
+    depth = {rec['name']:rec['depth'] for rec in prof.records}
+    assert depth['fields.ampl_scat_mat']==0 and depth['transform.tensor_scat']==1
+
+    prof.to_json(tmp_path/'prof.json')
+    prof.to_chrome_trace(tmp_path/'trace.json')
+    with open(tmp_path/'trace.json') as f:
+        events = json.load(f)['traceEvents']
+    assert len(events)==len(prof.records)
+    assert all(event['ph']=='X' and event['dur']>=0. for event in events)
+    with open(tmp_path/'prof.json') as f:
+        assert json.load(f)['summary'].keys()==summary.keys()
@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+from rayleighpy import kernel
+
+def _inputs(nori, ninc, nsca):
+    rng = np.random.default_rng(4)
+    particle = [*rng.uniform(0.2, 2., (3,nori)), rng.uniform(1.5, 3.5, nori)+0.05j, *(rng.random((3,nori))*np.pi)]
+    angles = [rng.random(ninc)*2.*np.pi, rng.random(ninc)*np.pi, rng.random(nsca)*2.*np.pi, rng.random(nsca)*np.pi]
+    return particle+angles+[2.*np.pi/32.1]
+
+# test that the compiled kernel matches the numpy chain
+def test_fused_scat_numba():
+    pytest.importorskip('numba')
+    args = _inputs(20, 3, 11)
+    smat = kernel.fused_scat(*args, backend='numba')
+    smat_ref = kernel.fused_scat(*args, backend='numpy')
+    assert np.allclose(smat, smat_ref, rtol=1.e-12, atol=1.e-15*np.max(np.abs(smat_ref)))
+
+# test the uncompiled loop so the kernel logic is checked without numba
+def test_scat_loop():
+    args = _inputs(4, 2, 5)
+    smat_ref = kernel.fused_scat(*args, backend='numpy')
+    smat = np.empty_like(smat_ref)
+    pvals = np.array(kernel.ellipsoid(*args[:4]))
+    bas_inc = np.moveaxis(kernel.spherical_basis(*args[7:9])[:,:2], 1, 0)
+    bas_sca = np.moveaxis(kernel.spherical_basis(*args[9:11])[:,:2], 1, 0)
+    kernel._scat_loop(pvals, np.array(args[4:7]), bas_inc, bas_sca, 1j*args[11]**3./(4.*np.pi), smat)
+    assert np.allclose(smat, smat_ref, rtol=1.e-12, atol=1.e-15*np.max(np.abs(smat_ref)))
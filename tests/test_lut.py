@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+from rayleighpy import transform
+from rayleighpy import polarizability
+from rayleighpy import fields
+from rayleighpy import lut
+
+# test an incremental lookup table build against the direct pipeline
+def test_build_lut(tmp_path):
+    fname = tmp_path/'table.lut'
+    phi = np.linspace(0., 360., 13)*np.pi/180.
+    theta = np.linspace(0., 180., 7)*np.pi/180.
+    beta = np.linspace(0., 90., 4)*np.pi/180.
+    a = np.array([1.,2.,0.5])
+    eps = np.array([3.17+0.01j, 3.17+0.01j, 80.+20.j])
+    args = (a, 0.8*a, 0.3*a, eps, 2.*np.pi/32.1, 0.*beta, beta, 0.*beta, phi, theta)
+
+    assert lut.build_lut(fname, *args, max_entries=2)==2
+    assert lut.build_lut(fname, *args)==3
+
+    table = lut.open_lut(fname)
+    assert table['smat'].shape==(3,2,2,4,13,7)
+    assert np.all(table['done']==1)
+    alp_a, alp_b, alp_c = polarizability.ellipsoid(a[2], 0.8*a[2], 0.3*a[2], eps[2])
+    alp_tens = transform.pc_rotate(alp_a, alp_b, alp_c, 0.*beta, beta, 0.*beta)
+    smat = fields.ampl_scat_mat_bh(phi, theta, alp_tens, 2.*np.pi/32.1)
+    assert np.array_equal(table['smat'][2], smat)
+
+# test the stored parameter arrays and that resuming with different parameters is refused
+def test_lut_arrays(tmp_path):
+    fname = tmp_path/'table.lut'
+    beta = np.linspace(0., 90., 4)*np.pi/180.
+    a = np.linspace(0.5, 2., 50)
+    args = [a, 0.8*a, 0.3*a, 3.17+0.01j, 2.*np.pi/32.1, 0.*beta, beta, 0.*beta, np.array([0.]), np.array([0., np.pi])]
+    lut.build_lut(fname, *args, max_entries=1)
+
+    table = lut.open_lut(fname)
+    assert np.array_equal(table['arrays']['a'], a)
+    assert np.array_equal(table['arrays']['eps'], np.full(50, 3.17+0.01j))
+    assert np.array_equal(table['arrays']['beta'], beta)
+    assert len(table['header']['arrays'])==10
+
+    args[0] = a*1.01
+    with pytest.raises(ValueError):
+        lut.build_lut(fname, *args)
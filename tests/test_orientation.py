@@ -0,0 +1,74 @@
+import numpy as np
+from rayleighpy import transform
+from rayleighpy import polarizability
+from rayleighpy import fields
+from rayleighpy import orientation
+
+# test the closed-form random orientation average against an exact product quadrature
+def test_orientation_average():
+    alp_a, alp_b, alp_c = polarizability.ellipsoid(2.,0.9,0.3, 3.17+0.5j)
+    phi_inc = np.array([0.3,1.])
+    theta_inc = np.array([1.2,0.4])
+    phi_sca = np.array([2.,0.1,4.])
+    theta_sca = np.array([0.5,2.5,1.6])
+    k = 2.*np.pi/32.1
+
+    # second moments are trigonometric polynomials of degree 2 in alpha and gamma and degree 4 in cos(beta)
+    ang = np.arange(8)*np.pi/4.
+    mu, wts = np.polynomial.legendre.leggauss(6)
+    alpha, beta, gamma = np.meshgrid(ang, np.arccos(mu), ang, indexing='ij')
+    wts = np.broadcast_to(wts[np.newaxis,:,np.newaxis], alpha.shape).flatten()/np.sum(wts)/64.
+    alp_tens = transform.pc_rotate(alp_a, alp_b, alp_c, alpha.flatten(), beta.flatten(), gamma.flatten())
+    smat = fields.ampl_scat_mat(phi_inc, theta_inc, phi_sca, theta_sca, alp_tens, k)
+    cov = np.einsum('ijklonm,o->ijklnm',
+                    fields.cov_mat(smat), wts)
+
+    cov_avg = orientation.orientation_average(alp_a, alp_b, alp_c, phi_inc, theta_inc, phi_sca, theta_sca, k)
+    assert np.max(np.abs(cov_avg[:,:,:,:,0]-cov))<1.e-12*np.max(np.abs(cov))
+
+    zmat = fields.mueller_mat(cov)
+    zmat_avg = orientation.orientation_average(alp_a, alp_b, alp_c, phi_inc, theta_inc, phi_sca, theta_sca, k, mueller=True)
+    assert np.max(np.abs(zmat_avg[:,:,0]-zmat))<1.e-12*np.max(np.abs(zmat))
+
+# test the adaptive quadrature for uniform orientations and a gaussian canting distribution
+def test_orientation_integrate():
+    alp_a, alp_b, alp_c = polarizability.ellipsoid(2.,2.,0.5, 3.17+0.5j)
+    k = 2.*np.pi/32.1
+
+    def backscatter_cov(alp_tens):
+        smat = fields.ampl_scat_mat(0., np.pi/2., np.pi, np.pi/2., alp_tens, k)
+        return fields.cov_mat(smat)[...,0,0]
+
+    cov, nori = orientation.orientation_integrate(backscatter_cov, alp_a, alp_b, alp_c, axis=4)
+    cov_avg = orientation.orientation_average(alp_a, alp_b, alp_c, 0., np.pi/2., np.pi, np.pi/2., k)
+    assert np.max(np.abs(cov-cov_avg[...,0,0,0]))<1.e-6*np.max(np.abs(cov))
+
+    # narrow canting distribution approaches the unrotated particle
+    pdf = lambda beta: np.exp(-0.5*(beta/0.01)**2.)*np.sin(beta)
+    cov, nori = orientation.orientation_integrate(backscatter_cov, alp_a, alp_b, alp_c, beta_pdf=pdf, beta_max=0.1, axis=4)
+    cov_0 = backscatter_cov(transform.pc_rotate(alp_a, alp_b, alp_c, 0., 0., 0.))[...,0]
+    assert np.max(np.abs(cov-cov_0))<1.e-3*np.max(np.abs(cov_0))
+
+# test the streaming accumulator against the closed-form average and a single-pass mean
+def test_orientation_stream():
+    alp_a, alp_b, alp_c = polarizability.ellipsoid(2.,0.9,0.3, 3.17+0.5j)
+    k = 2.*np.pi/32.1
+    func = lambda alp_tens: fields.cov_mat(fields.ampl_scat_mat(0.3, 1.2, np.array([2.,0.1]), np.array([0.5,2.5]),
+                                                                alp_tens, k))
+
+    batches = list(orientation.random_orientations(alp_a, alp_b, alp_c, batch=100, n_max=950, rng=1))
+    assert batches[-1].shape==(3,3,50)
+    acc = orientation.OrientationAccumulator()
+    for alp_tens in batches:
+        acc.update(func(alp_tens), axis=4)
+    samples = func(np.concatenate(batches, axis=2))
+    assert acc.count==950
+    assert np.allclose(acc.mean, np.mean(samples, axis=4))
+    assert np.allclose(acc.var, np.var(samples, axis=4, ddof=1))
+
+    # stop once the standard errors reach the tolerance and check the error against the closed form
+    acc = orientation.orientation_stream(func, orientation.random_orientations(alp_a, alp_b, alp_c, batch=500, rng=2),
+                                         axis=4, rtol=2.e-3)
+    cov_avg = orientation.orientation_average(alp_a, alp_b, alp_c, 0.3, 1.2, np.array([2.,0.1]), np.array([0.5,2.5]), k)
+    assert acc.converged(rtol=2.e-3)
+    assert np.all(np.abs(acc.mean-cov_avg[:,:,:,:,0])<=5.*acc.sem+1.e-12*np.max(np.abs(cov_avg)))
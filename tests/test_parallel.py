@@ -0,0 +1,46 @@
+import numpy as np
+from rayleighpy import transform
+from rayleighpy import polarizability
+from rayleighpy import fields
+from rayleighpy import parallel
+
+# test that thread and process pools match the serial calculation
+def test_parallel_fields():
+    phi = np.linspace(0., 360., 13)*np.pi/180.
+    theta = np.linspace(0., 180., 7)*np.pi/180.
+    rng = np.random.default_rng(5)
+    alpha, beta, gamma = rng.random((3,50))*2.*np.pi
+    alp_a, alp_b, alp_c = polarizability.ellipsoid(2.,0.9,0.1, 3.17+0.1j)
+    k = 2.*np.pi/32.1
+
+    alp_tens = transform.pc_rotate(alp_a, alp_b, alp_c, alpha, beta, gamma)
+    smat_bh = fields.ampl_scat_mat_bh(phi, theta, alp_tens, k)
+    smat = fields.ampl_scat_mat(phi, 0.*phi+0.5, phi, theta, alp_tens, k, grid=True)
+    smat_f = fields.ampl_fscat_mat(phi, 0.*phi+0.5, alp_tens, k)
+    for executor in ('thread', 'process'):
+        kwargs = {'workers':2, 'chunk':7, 'executor':executor}
+        assert np.array_equal(transform.pc_rotate(alp_a, alp_b, alp_c, alpha, beta, gamma, **kwargs), alp_tens)
+        # blocks may use a different contraction order than the full calculation
+        assert np.allclose(fields.ampl_scat_mat_bh(phi, theta, alp_tens, k, **kwargs), smat_bh, rtol=1.e-12, atol=0.)
+        assert np.allclose(fields.ampl_scat_mat(phi, 0.*phi+0.5, phi, theta, alp_tens, k, grid=True, **kwargs), smat,
+                           rtol=1.e-12, atol=0.)
+        assert np.allclose(fields.ampl_fscat_mat(phi, 0.*phi+0.5, alp_tens, k, **kwargs), smat_f, rtol=1.e-12, atol=0.)
+
+# test that process workers write straight into a memory-mapped output without shared memory
+def test_parallel_memmap(tmp_path, monkeypatch):
+    phi = np.linspace(0., 360., 13)*np.pi/180.
+    theta = np.linspace(0., 180., 7)*np.pi/180.
+    rng = np.random.default_rng(5)
+    alpha, beta, gamma = rng.random((3,20))*2.*np.pi
+    alp_a, alp_b, alp_c = polarizability.ellipsoid(2.,0.9,0.1, 3.17+0.1j)
+    alp_tens = transform.pc_rotate(alp_a, alp_b, alp_c, alpha, beta, gamma)
+    k = 2.*np.pi/32.1
+    smat_bh = fields.ampl_scat_mat_bh(phi, theta, alp_tens, k)
+
+    def no_shm(*args, **kwargs):
+        raise AssertionError('shared memory used for a memmap output')
+    monkeypatch.setattr(parallel, 'SharedMemory', no_shm)
+    out = np.lib.format.open_memmap(tmp_path/'smat.npy', mode='w+', dtype=complex, shape=smat_bh.shape)
+    fields.ampl_scat_mat_bh(phi, theta, alp_tens, k, out=out, workers=2, chunk=7, executor='process')
+    assert np.allclose(out, smat_bh, rtol=1.e-12, atol=0.)
+    assert np.allclose(np.load(tmp_path/'smat.npy'), smat_bh, rtol=1.e-12, atol=0.)
@@ -1,7 +1,28 @@
 from rayleighpy import polarizability
 import numpy as np
+import pytest
 
 # test ellipsoid
 def test_ellipsoid():
     alp_a, alp_b, alp_c = polarizability.ellipsoid(1.,1.,1.,2.)
     assert (alp_a,alp_b,alp_c)==(np.pi,np.pi,np.pi)
+
+# test the interpolated shape factors against the elliptic integrals
+def test_shape_factor_table(tmp_path):
+    table = polarizability.shape_factor_table(ratio_max=10., nratio=129, fname=tmp_path/'table.npz')
+    table = polarizability.shape_factor_table(ratio_max=10., nratio=129, fname=tmp_path/'table.npz')
+    assert table['err']<1.e-3
+    # a saved table built with other parameters is not silently replaced
+    with pytest.raises(ValueError):
+        polarizability.shape_factor_table(ratio_max=20., nratio=129, fname=tmp_path/'table.npz')
+    with pytest.raises(ValueError):
+        polarizability.shape_factor_table(ratio_max=10., nratio=65, fname=tmp_path/'table.npz')
+
+    rng = np.random.default_rng(4)
+    a, b, c = np.exp(rng.uniform(-3., 3., (3,1000)))
+    la, lb, lc = polarizability.shape_factors(a, b, c)
+    la_in, lb_in, lc_in = polarizability.shape_factors(a, b, c, table=table)
+    assert np.allclose(la+lb+lc, 1.)
+    assert np.max(np.abs(lb_in-lb))<=table['err']
+    assert np.max(np.abs(lc_in-lc))<=table['err']
+    assert np.max(np.abs(la_in-la))<=2.*table['err']
@@ -0,0 +1,29 @@
+import numpy as np
+from rayleighpy import transform
+from rayleighpy import polarizability
+from rayleighpy import fields
+from rayleighpy import population
+
+# test the blocked population pipeline against per-particle calls
+def test_scat_population():
+    rng = np.random.default_rng(8)
+    npart = 25
+    c = rng.uniform(0.1, 1., npart)
+    pop = population.Population(c*rng.uniform(1., 3., npart), c*rng.uniform(1., 3., npart), c,
+                                rng.uniform(1.5, 3.5, npart)+0.01j, *(rng.random((3,npart))*np.pi),
+                                weight=rng.random(npart))
+    phi = np.linspace(0., 360., 7)*np.pi/180.
+    theta = np.linspace(0., 180., 5)*np.pi/180.
+    k = 2.*np.pi/32.1
+
+    smat = population.scat_population(pop, 0., 0.3, phi, theta, k, block=10, grid=True)
+    for ip in [0,13,24]:
+        alp_a, alp_b, alp_c = polarizability.ellipsoid(pop.a[ip], pop.b[ip], pop.c[ip], pop.eps[ip])
+        alp_tens = transform.pc_rotate(alp_a, alp_b, alp_c, pop.alpha[ip], pop.beta[ip], pop.gamma[ip])
+        smat_p = fields.ampl_scat_mat(0., 0.3, phi, theta, alp_tens, k, grid=True)
+        assert np.allclose(smat[:,:,ip], smat_p[:,:,0], rtol=1.e-12, atol=0.)
+
+    smat_sum = population.scat_population(pop, 0., 0.3, phi, theta, k, reduce='amplitude', block=10, grid=True)
+    assert np.allclose(smat_sum, np.einsum('ijpnm,p->ijnm', smat, pop.weight))
+    cov_sum = population.scat_population(pop, 0., 0.3, phi, theta, k, reduce='cov', block=10, grid=True)
+    assert np.allclose(cov_sum, np.einsum('ijklpnm,p->ijklnm', fields.cov_mat(smat), pop.weight))
@@ -0,0 +1,25 @@
+import numpy as np
+from rayleighpy import transform
+from rayleighpy import polarizability
+from rayleighpy import radar
+
+# test observables for a sphere and an oblate spheroid
+def test_radar_obs():
+    eps = 80.+20.j
+    kw2 = np.abs((eps-1.)/(eps+2.))**2.
+    alp_a, alp_b, alp_c = polarizability.ellipsoid(0.5, 0.5, 0.5, eps)
+    alp_tens = transform.pc_rotate(alp_a, alp_b, alp_c, 0., 0., 0.)
+    obs = radar.radar_obs(alp_tens, 2.*np.pi/32.1, kw2=kw2)
+    assert np.abs(obs['zh']-1.)<1.e-12
+    assert np.abs(obs['zdr'])<1.e-12
+    assert np.abs(obs['kdp'])<1.e-12
+
+    # horizontally aligned oblate spheroids
+    beta = np.linspace(0., 10., 11)*np.pi/180.
+    alp_a, alp_b, alp_c = polarizability.ellipsoid(0.5, 0.5, 0.3, eps)
+    alp_tens = transform.pc_rotate(alp_a, alp_b, alp_c, 0., beta, np.pi/2.)
+    obs = radar.radar_obs(alp_tens, 2.*np.pi/32.1, kw2=kw2)
+    assert obs['zdr']>0.
+    assert obs['kdp']>0.
+    assert obs['ldr']<-20.
+    assert 0.99<obs['rhohv']<=1.
@@ -0,0 +1,26 @@
+import numpy as np
+from rayleighpy import transform
+from rayleighpy import polarizability
+from rayleighpy import fields
+from rayleighpy import result
+
+# test lazily computed elements and slices against the full amplitude matrices
+def test_scattering_result():
+    phi = np.linspace(0., 360., 13)*np.pi/180.
+    theta = np.linspace(0., 180., 7)*np.pi/180.
+    beta = np.linspace(0., 90., 5)*np.pi/180.
+    alp_a, alp_b, alp_c = polarizability.ellipsoid(2.,0.9,0.1, 3.17+0.1j)
+    alp_tens = transform.pc_rotate(alp_a, alp_b, alp_c, beta, beta, 0.*beta)
+    k = 2.*np.pi/32.1
+
+    smat = fields.ampl_scat_mat_bh(phi, theta, alp_tens, k)
+    res = result.lazy_scat_mat_bh(phi, theta, alp_tens, k)
+    assert np.allclose(res[1,1], smat[1,1], rtol=1.e-12, atol=0.)
+    assert np.allclose(res[0,1,1:3,::2,[0,4]], smat[0,1,1:3,::2][:,:,[0,4]], rtol=1.e-12, atol=0.)
+    assert res[1,1,1:3] is res[1,1,1:3]
+    assert np.allclose(res.mueller(slice(None), 3), fields.mueller_mat(fields.cov_mat(smat[:,:,:,3])), rtol=1.e-10)
+
+    smat = fields.ampl_scat_mat(phi, 0.*phi+0.5, phi, theta, alp_tens, k, grid=True)
+    res = result.lazy_scat_mat(phi, 0.*phi+0.5, phi, theta, alp_tens, k, grid=True)
+    assert np.allclose(res.amplitude(), smat, rtol=1.e-12, atol=0.)
+    assert np.allclose(res.power(0,0,2), np.abs(smat[0,0,2])**2., rtol=1.e-12, atol=0.)
@@ -2,6 +2,7 @@ import numpy as np
 from rayleighpy import transform
 from rayleighpy import polarizability
 from rayleighpy import fields
+from rayleighpy import vectors
 
 # test principle component tensor rotation
 def test_pc_rotate():
@@ -42,3 +43,123 @@ def test_bh_hv_basis():
     # compare hv and sph conventions
     err = np.sqrt(np.mean(np.abs(smat_hv-smat)**2.))
     assert err<1.e-16
+
+# test that every contraction order matches the direct einsum contraction
+def test_tensor_scat_orders():
+    rng = np.random.default_rng(1)
+    tens = rng.standard_normal((3,3,4))+1j*rng.standard_normal((3,3,4))
+    bas_inc = vectors.spherical_basis(rng.random(5)*2.*np.pi, rng.random(5)*np.pi)
+    bas_sca = vectors.spherical_basis(rng.random(6)*2.*np.pi, rng.random(6)*np.pi)
+    bas_bh = vectors.spherical_basis(rng.random(30)*2.*np.pi, rng.random(30)*np.pi)
+    bas_bh.shape = (3,3,5,6)
+    vh_inc = bas_inc[:,:2,:]
+
+    tens_inc = np.einsum('ijo,jkp->ikop', tens, vh_inc)
+    ref = {'general':np.einsum('ilq,ikop->lkopq', bas_sca[:,:2,:], tens_inc),
+           'bh':np.einsum('ilpq,ikop->lkopq', bas_bh[:,:2,:,:], tens_inc),
+           'fscat':np.einsum('ilp,ikop->lkop', vh_inc, tens_inc)}
+    bas = {'general':bas_sca, 'bh':bas_bh, 'fscat':bas_inc}
+    for (mode, order), contract in transform._CONTRACTIONS.items():
+        tens_sca = contract(tens, vh_inc, bas[mode][:,:2,...])
+        assert tens_sca.shape==ref[mode].shape
+        assert np.max(np.abs(tens_sca-ref[mode]))<1.e-12
+
+    # a single (3,3) tensor is expanded without changing the caller's array
+    tens_1 = tens[:,:,0].copy()
+    tens_sca = transform.tensor_scat(tens_1, bas_inc, bas_sca)
+    assert tens_1.shape==(3,3)
+    assert np.max(np.abs(tens_sca[:,:,0]-ref['general'][:,:,0]))<1.e-12
+
+    # the cached contraction orders are bounded, keeping the most recently used
+    transform.contraction_plan('general', 1, 1, 1)
+    for nori in range(2, transform._PLANS_SIZE+2):
+        transform.contraction_plan('general', nori, 1, 1)
+        transform.contraction_plan('general', 1, 1, 1)
+    assert len(transform._plans)<=transform._PLANS_SIZE
+    assert ('general', 1, 1, 1) in transform._plans
+
+# test rotating a population of particles with their own principal values
+def test_pc_rotate_population():
+    rng = np.random.default_rng(3)
+    pvals = rng.standard_normal((3,20))+1j*rng.standard_normal((3,20))
+    alpha, beta, gamma = rng.random((3,20))*2.*np.pi
+    tens_tr = transform.pc_rotate(pvals[0], pvals[1], pvals[2], alpha, beta, gamma)
+    for l in range(20):
+        tens_l = transform.pc_rotate(pvals[0,l], pvals[1,l], pvals[2,l], alpha[l], beta[l], gamma[l])
+        assert np.max(np.abs(tens_tr[:,:,l]-tens_l[:,:,0]))<1.e-14
+
+    # rotation matrices match scipy's intrinsic zyz convention
+    from scipy.spatial.transform import Rotation
+    rmat = Rotation.from_euler('ZYZ', np.array([alpha,beta,gamma]).T).as_matrix()
+    assert np.max(np.abs(transform.rotation_matrix(alpha, beta, gamma).transpose(2,0,1)-rmat))<1.e-14
+
+# test mapping particle-frame amplitude matrices to lab-frame direction pairs
+def test_scatdir_lab():
+    phi = np.linspace(0., 360., 73)*np.pi/180.
+    theta = np.linspace(0., 180., 37)*np.pi/180.
+    rng = np.random.default_rng(6)
+    alpha, beta, gamma = rng.random((3,4))*2.*np.pi
+    alp_a, alp_b, alp_c = polarizability.ellipsoid(2.,0.9,0.1, 3.17+0.1j)
+    alp_tens = transform.pc_rotate(alp_a, alp_b, alp_c, alpha, beta, gamma)
+    k = 2.*np.pi/32.1
+
+    for phi_inc, theta_inc in [(0.7,1.1), (0.,0.), (4.,2.9), (2.2,np.pi/2.)]:
+        # scattered directions on the particle-frame grid, then random lab directions off the grid
+        rot = transform.beam_frame(phi_inc, theta_inc)[:,:,0]
+        iphi = np.array([0,5,20,40,72])
+        itheta = np.array([36,10,18,0,25])
+        dir_lab = rot.T@vectors.grid_basis(phi, theta)[:,2,iphi,itheta]
+        phi_sca = np.concatenate((np.arctan2(dir_lab[1], dir_lab[0]), rng.random(6)*2.*np.pi))
+        theta_sca = np.concatenate((np.arccos(np.clip(dir_lab[2], -1., 1.)), rng.random(6)*np.pi))
+
+        # amplitude matrices for the tensors in the beam frame
+        alp_beam = np.einsum('ab,bco,dc->ado', rot, alp_tens, rot)
+        smat_bh = fields.ampl_scat_mat_bh(phi, theta, alp_beam, k)
+        smat_lab = transform.scatdir_lab(smat_bh, phi, theta, phi_inc, theta_inc, phi_sca, theta_sca)
+
+        smat = fields.ampl_scat_mat(phi_inc, theta_inc, phi_sca, theta_sca, alp_tens, k)[:,:,:,0,:]
+        assert np.max(np.abs(smat_lab-smat))<1.e-12*np.max(np.abs(smat))
+
+# test removing redundant orientations of spheroids on a phi-theta grid
+def test_unique_orientations():
+    phi = np.linspace(0., 360., 73)*np.pi/180.
+    theta = np.linspace(0., 180., 37)*np.pi/180.
+    phif, thetaf = np.meshgrid(phi, theta, indexing='ij')
+    phif = phif.flatten()
+    thetaf = thetaf.flatten()
+    alp_a, alp_b, alp_c = polarizability.ellipsoid(2.,2.,0.5, 3.17+0.1j)
+
+    alp_tens = transform.pc_rotate(alp_a, alp_b, alp_c, phif, thetaf, 0.*phif)
+    pvals, inverse = transform.unique_orientations(alp_a, alp_b, alp_c, phif, thetaf, 0.*phif)
+    assert len(pvals[0])==37
+    tens_dedup = transform.pc_rotate(alp_a, alp_b, alp_c, phif, thetaf, 0.*phif, dedup=True)
+    assert np.max(np.abs(tens_dedup-alp_tens))<1.e-12
+
+    # particles with small absolute polarizabilities (si units) stay distinct
+    pvals_si = polarizability.ellipsoid(np.array([1.,2.,3.])*1.e-4, 1.e-4, 0.5e-4, 3.17+0.1j)
+    pvals, inverse = transform.unique_orientations(*pvals_si, 0.3, 0.6, 0.9)
+    assert len(pvals[0])==3
+    tens_dedup = transform.pc_rotate(*pvals_si, 0.3, 0.6, 0.9, dedup=True)
+    tens = transform.pc_rotate(*pvals_si, 0.3, 0.6, 0.9)
+    assert np.max(np.abs(tens_dedup-tens))<1.e-12*np.max(np.abs(tens))
+
+    # a wide range of sizes stays distinct per particle and per tensor
+    diam = np.geomspace(0.01, 10., 500)
+    pvals_d = polarizability.ellipsoid(diam/2., 0.4*diam, 0.25*diam, 3.17+0.1j)
+    ang = np.random.default_rng(0).random((3,500))*np.pi
+    tens = transform.pc_rotate(*pvals_d, *ang)
+    tens_dedup = transform.pc_rotate(*pvals_d, *ang, dedup=True)
+    assert np.all(np.max(np.abs(tens_dedup-tens), axis=(0,1))<=1.e-12*np.max(np.abs(tens), axis=(0,1)))
+    assert transform.unique_tensors(tens)[0].shape[2]==500
+    smat = fields.ampl_scat_mat(0., 0.3, phi[:5], theta[:5], tens, 2.*np.pi/32.1)
+    smat_dedup = fields.ampl_scat_mat(0., 0.3, phi[:5], theta[:5], tens, 2.*np.pi/32.1, dedup=True)
+    assert np.all(np.max(np.abs(smat_dedup-smat), axis=(0,1,3,4))<=1.e-12*np.max(np.abs(smat), axis=(0,1,3,4)))
+
+    # grid-symmetric tensors of a general ellipsoid
+    alp_a, alp_b, alp_c = polarizability.ellipsoid(2.,0.9,0.1, 3.17+0.1j)
+    alp_tens = transform.pc_rotate(alp_a, alp_b, alp_c, phif, thetaf, 0.*phif)
+    tens_u, inverse = transform.unique_tensors(alp_tens)
+    assert tens_u.shape[2]<0.5*len(phif)
+    smat = fields.ampl_scat_mat_bh(phi, theta, alp_tens[:,:,::20], 2.*np.pi/32.1)
+    smat_dedup = fields.ampl_scat_mat_bh(phi, theta, alp_tens[:,:,::20], 2.*np.pi/32.1, dedup=True)
+    assert np.max(np.abs(smat_dedup-smat))<1.e-12*np.max(np.abs(smat))
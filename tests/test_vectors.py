@@ -0,0 +1,14 @@
+import numpy as np
+from rayleighpy import vectors
+
+# test the separable grid basis against the basis on the flattened grid
+def test_grid_basis():
+    phi = np.linspace(0., 360., 73)*np.pi/180.
+    theta = np.linspace(0., 180., 37)*np.pi/180.
+    phif, thetaf = np.meshgrid(phi, theta, indexing='ij')
+    basis = vectors.spherical_basis(phif.flatten(), thetaf.flatten())
+
+    basis_grid = vectors.grid_basis(phi, theta)
+    assert basis_grid.shape==(3,3,73,37)
+    assert np.array_equal(basis_grid.reshape(3,3,-1), basis)
+    assert vectors.grid_basis(phi.copy(), theta.copy()) is basis_grid